@@ -1,20 +1,127 @@
-import platform
-from pathlib import Path
+import sys
 
 import utils.command4py as c4py
-from ramen import RamenEnv
 
 import settings
 
 class RamenCLI(c4py.Program):
-	env = RamenEnv(Path(settings.ROOT) / "dependencies")
+	_env = None
+
+	# The environment is created by the first command that uses it, and it's shared by every
+	# instance so a server keeps the same one between the requests
+	@property
+	def env(self):
+		if RamenCLI._env is None:
+			from pathlib import Path
+			from ramen import RamenEnv
+			RamenCLI._env = RamenEnv(Path(settings.ROOT) / "dependencies")
+		return RamenCLI._env
 	
-	@c4py.command(description="Build your Project")
-	def build(self, projectdir: str, output: str = "a"):
-		self.env.build_project(projectdir)
+	@c4py.command(description="Build your Project", help={
+		"opt" : "Optimization level, 0 for none, 1 to fold constant operations and turn self tail calls into loops, 2 to also remove unused functions",
+		"compact" : "Keep the parsed program in a compact node store to use less memory",
+		"rebuild" : "Compile every file again instead of using the build cache",
+		"jobs" : "Number of processes that compile the files, 0 for one per core",
+		"stats" : "Print the time of every phase and the counters of the build as JSON",
+		"noinline" : "Call echo, echoln and arrlen instead of the Neko primitives they use, e.g when the program defines its own",
+		"bytecode" : "Write the NekoVM module (<project>.n) instead of the Neko source, run doesn't need nekoc to run it",
+	})
+	def build(self, projectdir: str, output: str = "a", opt: int = 0, compact: bool = False, rebuild: bool = False, jobs: int = 1, stats: bool = False, noinline: bool = False, bytecode: bool = False):
+		build_stats = self.env.build_project(projectdir, compact=compact, opt=opt, rebuild=rebuild, jobs=jobs, inline=not noinline, bytecode=bytecode)
+		if stats:
+			print(build_stats.to_json())
+
+	@c4py.command(description="Build many Projects at once, each one on its own and in parallel", help={
+		"opt" : "Optimization level, see build",
+		"compact" : "Keep the parsed programs in a compact node store to use less memory",
+		"rebuild" : "Compile every file again instead of using the build caches",
+		"jobs" : "Number of processes that build the projects, 0 for one per core",
+		"stats" : "Print the stats of every build as JSON",
+		"noinline" : "Call echo, echoln and arrlen instead of the Neko primitives they use, see build",
+		"bytecode" : "Write the NekoVM modules instead of the Neko sources, see build",
+	})
+	def build_all(self, projectdirs: list[str], opt: int = 0, compact: bool = False, rebuild: bool = False, jobs: int = 0, stats: bool = False, noinline: bool = False, bytecode: bool = False):
+		import json
+		import time
+		start = time.perf_counter()
+		results = self.env.build_projects(projectdirs, jobs=jobs, opt=opt, compact=compact, rebuild=rebuild, inline=not noinline, bytecode=bytecode)
+		failed = 0
+		for projectdir, build_stats, error in results:
+			if error is not None:
+				failed += 1
+				print(f"FAILED {projectdir}: {error}")
+				continue
+			counters = build_stats.counters
+			print(f"Built  {projectdir} in {build_stats.phases['total'] * 1000:.1f}ms ({counters.get('files_compiled', 0)} compiled, {counters.get('files_cached', 0)} cached, {counters.get('output_bytes', 0)} bytes)")
+		print(f"Built {len(results) - failed}/{len(results)} projects in {time.perf_counter() - start:.3f}s" + (f", {failed} failed" if failed else ""))
+		if stats:
+			print(json.dumps({ str(projectdir) : build_stats.as_dict() for projectdir, build_stats, _ in results if build_stats is not None }, indent=2))
+		sys.exit(1 if failed else 0)
+
+	@c4py.command(description="Run your Ramen program in NekoVM's binaries", help={
+		"times" : "Print the wall time of every phase of the run",
+	})
+	def run(self, nekosource: str, times: bool = False):
+		report = self.env.run(nekosource)
+		if times:
+			print(report, file=sys.stderr)
+		sys.exit(report.returncode)
+
+	@c4py.command(description="Build your Project every time one of its files changes", help={
+		"opt" : "Optimization level, see build",
+		"jobs" : "Number of processes that compile the files, 0 for one per core",
+		"run" : "Run the program after every build",
+		"poll" : "Look for changes at an interval instead of using inotify",
+		"noinline" : "Call echo, echoln and arrlen instead of the Neko primitives they use, see build",
+		"bytecode" : "Write the NekoVM module instead of the Neko source, see build",
+	})
+	def watch(self, projectdir: str, opt: int = 0, jobs: int = 1, run: bool = False, poll: bool = False, noinline: bool = False, bytecode: bool = False):
+		try:
+			self.env.watch_project(projectdir, opt=opt, jobs=jobs, run=run, poll=poll, inline=not noinline, bytecode=bytecode)
+		except KeyboardInterrupt:
+			pass
+
+	@c4py.command(description="Benchmark the lexer, the parser and the code generation (needs the bench directory of the repository)", help={
+		"scales" : "Comma separated numbers of lines of the generated programs, up to 1000000",
+		"save" : "Save the results as the baseline",
+		"compare" : "Fail when the results are worse than the baseline",
+		"threshold" : "The regression that fails a comparison, 0.2 is 20%%",
+		"baseline" : "The baseline file, bench/baselines/default.json by default",
+	})
+	def bench(self, scales: str = "1000,10000,100000", save: bool = False, compare: bool = False, threshold: float = 0.2, baseline: str = ""):
+		from pathlib import Path
+		sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bench"))
+		import suite
+		argv = ["--scales", scales, "--threshold", str(threshold)]
+		for flag, enabled in [("--save", save), ("--compare", compare)]:
+			if enabled:
+				argv += [flag, baseline] if baseline else [flag]
+		sys.exit(suite.main(argv))
 
-	@c4py.command(description="Run your Ramen program in NekoVM's binaries")
-	def run(self, nekosource: str):
-		self.env.run(nekosource)
+	@c4py.command(description="Keep a compiler running, build and run are sent to it while it runs", help={
+		"socket" : "The Unix socket of the server, RAMEN_SOCKET or ramen-<user>.sock in the temporary directory by default",
+		"stop" : "Stop the server that is running",
+	})
+	def serve(self, socket: str = "", stop: bool = False):
+		from ramen.client import default_socket_path, request
+		from ramen.server import RamenServer
+		socketpath = socket or default_socket_path()
+		if stop:
+			if request({ "shutdown" : True }, socketpath) is None:
+				print(f"No server is running on {socketpath}")
+			return
+		self.env.compiled = {}
+		self.env.runner.capture = True
+		server = RamenServer(socketpath, lambda argv: c4py.run(RamenCLI, argv))
+		print(f"Ramen server is listening on {socketpath}", flush=True)
+		server.serve()
 
-c4py.run(RamenCLI)
\ No newline at end of file
+# The worker processes of a build import this module again on Windows, only the main process runs the CLI
+# The commands are sent to the server when one is running
+if __name__ == "__main__":
+	from ramen.client import forward
+	code = forward(sys.argv[1:])
+	if code is None:
+		c4py.run(RamenCLI)
+	else:
+		sys.exit(code)
\ No newline at end of file
@@ -1,6 +1,27 @@
-from .token import Token, TokenTypes
-from .lexer import Lexer
-from .ast import Parser
+from .version import __version__
 
-from .bundler import Bundler
-from .environment import RamenEnv
\ No newline at end of file
+# The names of the package are imported from their module when they are used for the first time (PEP 562),
+# so "import ramen" doesn't load the whole compiler, e.g the CLI only needs it for some commands
+EXPORTS = {
+	"Token" : "token",
+	"TokenTypes" : "token",
+	"TokenStream" : "token",
+	"Lexer" : "lexer",
+	"Parser" : "ast",
+	"NodeStore" : "arena",
+	"Bundler" : "bundler",
+	"RamenEnv" : "environment",
+}
+
+__all__ = ["__version__"] + list(EXPORTS)
+
+def __getattr__(name: str):
+	if name not in EXPORTS:
+		raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+	import importlib
+	value = getattr(importlib.import_module(f".{EXPORTS[name]}", __name__), name)
+	globals()[name] = value
+	return value
+
+def __dir__():
+	return __all__
@@ -0,0 +1,162 @@
+from __future__ import annotations
+from array import array
+
+from . import ast
+from .ast import AST, fields, children
+
+# The order of this list is the kind number of a node in a NodeStore
+NODE_TYPES = [
+	ast.Program,
+	ast.Value,
+	ast.Identifier,
+	ast.ArrayList,
+	ast.HashMap,
+	ast.Indexing,
+	ast.HashMapIndexing,
+	ast.VariableDeclaration,
+	ast.ValueDefinition,
+	ast.VariableInitialization,
+	ast.BlockStatement,
+	ast.FunctionArgs,
+	ast.FunctionCall,
+	ast.FunctionDefinition,
+	ast.LambdaFunction,
+	ast.ReturnStatemnt,
+	ast.Operation,
+	ast.Empty,
+	ast.Package,
+	ast.RepeatStatement,
+	ast.BreakStatement,
+	ast.ContinueStatement,
+	ast.IfStatement,
+	ast.RepeatRangeStatement,
+	ast.RepeatEachStatement,
+]
+KINDS = { cls : kind for kind, cls in enumerate(NODE_TYPES) }
+
+# A field is stored as an int, the lowest 3 bits tell what the rest of the int is
+NODE, STRING, LIST, NONE, INT = range(5)
+TAG_BITS = 3
+TAG_MASK = (1 << TAG_BITS) - 1
+
+"""
+NodeStore is a compact representation of the top level statements of a program. Instead of one object
+(and its fields) per node, the kind of every node and its fields are kept in integer arrays. A field that
+is a node is stored as the index of that node, the names and the literals are stored once in a string table
+and lists are stored in the fields array as their length followed by their items.
+The nodes of a statement are stored after their children, so a statement is rebuilt into AST objects
+only when it's needed, one at a time, e.g:
+store = Parser(tokens).parse_ast(NodeStore())
+store.emit(output)
+"""
+class NodeStore:
+	def __init__(self):
+		self.kinds = array("B")
+		self.offsets = array("i") # Where the fields of a node start in fields
+		self.fields = array("i")
+		self.roots = array("i") # The index of every top level statement
+		self.strings = []
+		self._string_ids = {}
+
+	def __len__(self):
+		return len(self.roots)
+
+	def __iter__(self):
+		for i in range(len(self.roots)):
+			yield self.statement(i)
+
+	@property
+	def body(self):
+		return list(self)
+
+	def add(self, node: AST):
+		# Store a statement with its children, the children are walked with an explicit stack
+		# because operations can be chained deeper than the recursion limit
+		written = {} # id of a node to its index, a node that is shared is only stored once
+		stack = [node]
+		while stack:
+			current = stack[-1]
+			if id(current) in written:
+				stack.pop()
+				continue
+			pending = [child for child in children(current) if id(child) not in written]
+			if pending:
+				stack.extend(pending)
+				continue
+			stack.pop()
+			written[id(current)] = self._write(current, written)
+		self.roots.append(written[id(node)])
+		return len(self.roots) - 1
+
+	def _write(self, node: AST, written: dict):
+		encoded = [self._encode(getattr(node, name), written) for name in fields(type(node))]
+		self.kinds.append(KINDS[type(node)])
+		self.offsets.append(len(self.fields))
+		self.fields.extend(encoded)
+		return len(self.kinds) - 1
+
+	def _encode(self, value, written: dict):
+		if isinstance(value, AST):
+			return written[id(value)] << TAG_BITS | NODE
+		if isinstance(value, str):
+			string_id = self._string_ids.get(value)
+			if string_id is None:
+				string_id = self._string_ids[value] = len(self.strings)
+				self.strings.append(value)
+			return string_id << TAG_BITS | STRING
+		if isinstance(value, list):
+			items = [self._encode(item, written) for item in value]
+			position = len(self.fields)
+			self.fields.append(len(items))
+			self.fields.extend(items)
+			return position << TAG_BITS | LIST
+		if value is None:
+			return NONE
+		if isinstance(value, int) and value >= 0:
+			return value << TAG_BITS | INT
+		raise TypeError(f"Can't store {value!r} in a NodeStore")
+
+	def statement(self, index: int):
+		# Rebuild the nodes of a top level statement, they are stored between the previous statement and its own node
+		end = self.roots[index]
+		start = self.roots[index - 1] + 1 if index > 0 else 0
+		nodes = {}
+		for i in range(start, end + 1):
+			cls = NODE_TYPES[self.kinds[i]]
+			node = cls.__new__(cls)
+			offset = self.offsets[i]
+			for j, name in enumerate(fields(cls)):
+				setattr(node, name, self._decode(self.fields[offset + j], nodes))
+			nodes[i] = node
+		return nodes[end]
+
+	def _decode(self, code: int, nodes: dict):
+		tag, value = code & TAG_MASK, code >> TAG_BITS
+		if tag == NODE:
+			return nodes[value]
+		if tag == STRING:
+			return self.strings[value]
+		if tag == LIST:
+			length = self.fields[value]
+			return [self._decode(item, nodes) for item in self.fields[value + 1:value + 1 + length]]
+		if tag == NONE:
+			return None
+		return value
+
+	def count_kinds(self, stats):
+		# Add the number of nodes of every type to a BuildStats without rebuilding the nodes
+		counts = [0] * len(NODE_TYPES)
+		for kind in self.kinds:
+			counts[kind] += 1
+		for kind, amount in enumerate(counts):
+			if amount:
+				stats.count_node(NODE_TYPES[kind].__name__, amount)
+		stats.count("nodes", len(self.kinds))
+
+	def emit(self, sink):
+		# Generate the code one statement at a time, like Program.emit
+		for statement in self:
+			statement.emit(sink)
+
+	def as_neko(self):
+		return ast.render(self)
@@ -1,16 +1,29 @@
 from __future__ import annotations
-from abc import ABC, abstractmethod
+import io
+import re
+from functools import cache
+from typing import TYPE_CHECKING
 
-from .token import TokenTypes, Token
+from .token import TokenTypes, Token, TokenStream
+
+if TYPE_CHECKING:
+	from .arena import NodeStore
+
+# Every node declares its fields in __slots__ so the nodes don't carry a __dict__,
+# the fields are also what the generic tools (e.g the NodeStore) work with
+class AST:
+	__slots__ = ()
 
-class AST(ABC):
-	@abstractmethod
 	def string(self):
-		pass
+		raise NotImplementedError
 
-	@abstractmethod
 	def as_neko(self):
-		pass
+		raise NotImplementedError
+
+	# Write the Neko code of the node to a file-like sink. The nodes that contain a body
+	# write it piece by piece instead of building the whole code as a string first
+	def emit(self, sink):
+		sink.write(self.as_neko())
 
 	def __str__(self):
 		return self.string()
@@ -19,6 +32,8 @@ class AST(ABC):
 		return self.string()
 
 class Program(AST):
+	__slots__ = ("body",)
+
 	def __init__(self, body: list[AST]):
 		self.body = body
 
@@ -29,13 +44,16 @@ class Program(AST):
 		return writer
 
 	def as_neko(self):
-		writer = ""
+		return render(self)
+
+	def emit(self, sink):
 		for b in self.body:
-			writer += b.as_neko()
-		return writer
+			b.emit(sink)
 
 # Actually for literal value
 class Value(AST):
+	__slots__ = ("value", "type")
+
 	def __init__(self, token: Token|ArrayList):
 		self.value = token.literal
 		self.type = token.type if token.type not in [TokenTypes.TOK_TRUE, TokenTypes.TOK_FALSE] else TokenTypes.TOK_BOOL
@@ -47,6 +65,8 @@ class Value(AST):
 		return self.string()
 
 class Identifier(AST):
+	__slots__ = ("name",)
+
 	def __init__(self, token: Token):
 		self.name = token.literal
 
@@ -57,17 +77,20 @@ class Identifier(AST):
 		return self.string()
 
 class ArrayList(AST):
+	__slots__ = ("items",)
+
 	def __init__(self, items: list[Value|Identifier]):
 		self.items = items
 
 	def string(self):
-		raise Exception("what")
 		return "["+", ".join([str(item) for item in self.items])+"]"
 
 	def as_neko(self):
-		return "$array("+", ".join([str(item) for item in self.items])+")"
+		return "$array("+", ".join([item.as_neko() for item in self.items])+")"
 
 class HashMap(AST):
+	__slots__ = ("pairs",)
+
 	def __init__(self, pairs: list[ValueDefinition]):
 		self.pairs = pairs
 
@@ -80,13 +103,55 @@ class HashMap(AST):
 			pairs.append(pair.left.as_neko() + " => " + pair.right.as_neko())
 		return "{"+",".join([str(p) for p in pairs])+"}"
 
+# The runtime functions (see builtins.neko) of the keys whose type is only known at run time
+INDEX = "__index"
+SET_INDEX = "__setindex"
+# The names that nekoc takes as a field after a dot
+NEKO_FIELD = re.compile(r"[A-Za-z_]\w*\Z")
+NEKO_KEYWORDS = { "var", "while", "do", "if", "else", "function", "return", "break", "continue", "default",
+	"try", "catch", "switch", "this", "true", "false", "null" }
+
+def field_hash(name: str|bytes):
+	# The hash of a field name, the same as $hash in NekoVM (integers of 31 bits)
+	h = 0
+	for c in name.encode() if isinstance(name, str) else name:
+		h = (223 * h + c) & 0xFFFFFFFF
+		h = ((((h << 1) & 0xFFFFFFFF) ^ 0x80000000) - 0x80000000) >> 1
+	return h
+
+def key_neko(base: str, key: Value|Identifier, plain: bool, value: str|None = None):
+	"""
+	The Neko code that gets the key of base, or sets it to value. The key tells the type of base: a string
+	literal is a field of an object (a hashmap) and its hash is computed at compile time, an integer is an index
+	of an array. The type of any other key is checked at run time, inline when base is a plain name that can be
+	evaluated twice and with __index or __setindex otherwise
+	"""
+	if isinstance(key, Value) and key.type == TokenTypes.TOK_STRING:
+		if NEKO_FIELD.match(key.value) and key.value not in NEKO_KEYWORDS:
+			access = f"{base}.{key.value}"
+		else:
+			field = str(field_hash(key.value)) if "\\" not in key.value else f"$hash({key.as_neko()})"
+			return f"$objget({base}, {field})" if value is None else f"$objset({base}, {field}, {value})"
+	elif isinstance(key, Value):
+		access = f"{base}[{key.as_neko()}]"
+	elif plain:
+		k = key.as_neko()
+		if value is None:
+			return f"(if ($typeof({k}) == $tint) {base}[{k}] else $objget({base}, $hash({k})))"
+		return f"(if ($typeof({k}) == $tint) {base}[{k}] = {value} else $objset({base}, $hash({k}), {value}))"
+	else:
+		return f"{INDEX}({base}, {key.as_neko()})" if value is None else f"{SET_INDEX}({base}, {key.as_neko()}, {value})"
+	return access if value is None else f"{access} = {value}"
+
 """
-Indexing AST is used for getting a value in an arraylist or hashmap
+Indexing AST is used for getting or setting a value in an arraylist or hashmap
 e.g:
 users[0][name] 
-blogs[1]["title"]
+blogs[1]["title"] = "Ramen"
 """
 class Indexing(AST):
+	__slots__ = ("identifier", "args")
+
 	def __init__(self, identifier: Identifier, args: list[Value|Identifier]):
 		self.identifier = identifier
 		self.args = args
@@ -95,13 +160,32 @@ class Indexing(AST):
 		return f"{self.identifier}{''.join(['['+str(a)+']' for a in self.args])}"
 
 	def as_neko(self):
-		return self.string()
+		return self.access()
+
+	# The Neko code that sets the indexed item to value (already Neko code)
+	def assign(self, value: str):
+		return self.access(value)
+
+	def access(self, value: str|None = None):
+		writer = self.identifier.as_neko()
+		for i, arg in enumerate(self.args):
+			last = i == len(self.args) - 1
+			writer = key_neko(writer, arg, i == 0, value if last else None)
+		return writer
+
+	# The runtime functions that the generated code calls, the tree shaker has to keep them
+	def runtime_names(self):
+		if any(isinstance(arg, Identifier) for arg in self.args[1:]):
+			return { INDEX, SET_INDEX }
+		return set()
 
 class HashMapIndexing(Indexing):
-	pass
+	__slots__ = ()
 
 # var x
 class VariableDeclaration(AST):
+	__slots__ = ("identifier",)
+
 	def __init__(self, identifier: Identifier):
 		self.identifier = identifier
 
@@ -114,7 +198,9 @@ class VariableDeclaration(AST):
 
 # x = 1
 class ValueDefinition(AST):
-	def __init__(self, left: Identifier, right: Value|Identifier|ArrayList|HashMap|FunctionCall):
+	__slots__ = ("left", "right")
+
+	def __init__(self, left: Identifier|Indexing, right: Value|Identifier|ArrayList|HashMap|FunctionCall):
 		self.left = left
 		self.right = right
 
@@ -122,10 +208,14 @@ class ValueDefinition(AST):
 		return f"{self.left} = {self.right}"
 
 	def as_neko(self):
+		if isinstance(self.left, Indexing):
+			return self.left.assign(self.right.as_neko()) + ";"
 		return f"{self.left.as_neko()} = {self.right.as_neko()};"
 
 # var x = 1
 class VariableInitialization(AST):
+	__slots__ = ("valuedef", "vardec")
+
 	def __init__(self, valuedef: ValueDefinition):
 		self.valuedef = valuedef
 		self.vardec = VariableDeclaration(self.valuedef.left)
@@ -137,6 +227,8 @@ class VariableInitialization(AST):
 		return "var "  + self.valuedef.as_neko()
 
 class BlockStatement(AST):
+	__slots__ = ("body",)
+
 	def __init__(self, body: list[AST]):
 		self.body = body
 
@@ -147,10 +239,14 @@ class BlockStatement(AST):
 		return writer + "}"
 
 	def as_neko(self):
-		writer = "{\n"
+		return render(self)
+
+	def emit(self, sink):
+		sink.write("{\n")
 		for b in self.body:
-			writer += b.as_neko() + "\n"
-		return writer + "}"
+			b.emit(sink)
+			sink.write("\n")
+		sink.write("}")
 
 """
 This will be the arguments that's need to be handled by a function e.g ("localhost", 8080)
@@ -160,6 +256,8 @@ The reason of creating this in a separate AST is because we want to call a funct
 getRandomCallback("localhost", 8080)();
 """
 class FunctionArgs(AST):
+	__slots__ = ("arguments",)
+
 	def __init__(self, arguments: list[Value|Identifier]):
 		self.arguments = arguments
 
@@ -167,10 +265,12 @@ class FunctionArgs(AST):
 		return f"({','.join([str(a) for a in self.arguments])})".replace("\n", "")
 
 	def as_neko(self):
-		return self.string()
+		return f"({','.join([a.as_neko() for a in self.arguments])})"
 
 # x()
 class FunctionCall(AST):
+	__slots__ = ("identifier", "arguments")
+
 	def __init__(self, identifier: Identifier, args: list[FunctionArgs]):
 		self.identifier = identifier
 		self.arguments = args
@@ -179,9 +279,11 @@ class FunctionCall(AST):
 		return f"{self.identifier}{''.join([str(a) for a in self.arguments])}"
 
 	def as_neko(self):
-		return self.string()
+		return f"{self.identifier.as_neko()}{''.join([a.as_neko() for a in self.arguments])}"
 
 class FunctionDefinition(AST):
+	__slots__ = ("identifier", "params", "body")
+
 	def __init__(self, identifier: Token, params: list[Identifier], body: BlockStatement):
 		self.identifier = identifier
 		self.params = params
@@ -191,22 +293,36 @@ class FunctionDefinition(AST):
 		return f"fun {self.identifier}({','.join(['var ' + str(a) for a in self.params])}) {str(self.body)}"
 
 	def as_neko(self):
-		return f"var {self.identifier} = function({','.join([ a.as_neko() for a in self.params])}) {self.body.as_neko()}\n"
+		return render(self)
+
+	# The function is a global of the Neko module and not a local variable, a local captures the functions
+	# defined before it by value so it couldn't call itself or the functions that are defined after it
+	def emit(self, sink):
+		sink.write(f"{self.identifier} = function({','.join([ a.as_neko() for a in self.params])}) ")
+		self.body.emit(sink)
+		sink.write("\n")
 
 class LambdaFunction(AST):
+	__slots__ = ("params", "body")
+
 	def __init__(self, params: list[identifier], body: BlockStatement):
 		self.params = params
 		self.body = body
 
 	def string(self):
-		raise Exception("What")
 		return f"fun({','.join(['var ' + str(a) for a in self.params])}) {str(self.body)}"
 
 	def as_neko(self):
-		return f"function({','.join([a.as_neko() for a in self.params])}) {self.body.as_neko()}"
+		return render(self)
+
+	def emit(self, sink):
+		sink.write(f"function({','.join([a.as_neko() for a in self.params])}) ")
+		self.body.emit(sink)
 
 
 class ReturnStatemnt(AST):
+	__slots__ = ("value",)
+
 	def __init__(self, value: Value|Identifier|Operation):
 		self.value = value
 
@@ -214,21 +330,35 @@ class ReturnStatemnt(AST):
 		return "return " + str(self.value)
 
 	def as_neko(self):
-		return self.value.as_neko() + ";"
+		return "return " + self.value.as_neko() + ";"
 
 class Operation(AST):
+	__slots__ = ("left", "right", "op")
+
 	def __init__(self, left: Identifier|Value, op: Token, right: Identifier|Value|Operation):
 		self.left = left
 		self.right = right
 		self.op = op.literal
 
 	def string(self):
-		return f"{self.left} {self.op} {str(self.right)}"
+		return self.join(str)
 
 	def as_neko(self):
-		return self.string()
+		return self.join(lambda node: node.as_neko())
+
+	def join(self, convert):
+		# Operations are chained on their left, walk down the chain instead of recursing into it
+		node = self
+		rights = []
+		while isinstance(node, Operation):
+			rights.append(f"{node.op} {convert(node.right)}")
+			node = node.left
+		rights.append(convert(node))
+		return " ".join(reversed(rights))
 
 class Empty(AST):
+	__slots__ = ()
+
 	def string(self):
 		return ""
 
@@ -236,6 +366,8 @@ class Empty(AST):
 		return self.string()
 
 class Package(AST):
+	__slots__ = ("identifier", "body")
+
 	def __init__(self, identifier: Identifier, body: BlockStatement):
 		self.identifier = identifier
 		self.body = body
@@ -246,7 +378,12 @@ class Package(AST):
 	def as_neko(self):
 		return self.body.as_neko()
 
+	def emit(self, sink):
+		self.body.emit(sink)
+
 class RepeatStatement(AST):
+	__slots__ = ("body",)
+
 	def __init__(self, body: BlockStatement):
 		self.body = body
 
@@ -254,9 +391,82 @@ class RepeatStatement(AST):
 		return f"repeat {self.body}"
 
 	def as_neko(self):
-		return f"while (true) {self.body}"
+		return render(self)
+
+	def emit(self, sink):
+		sink.write("while (true) ")
+		self.body.emit(sink)
+
+# The hidden variables of the counted loops, their names can't be written in Ramen (no underscore in names)
+# and every loop declares them in its own block so nested loops don't share them
+LOOP_END = "__end"
+LOOP_ITEMS = "__items"
+LOOP_INDEX = "__i"
+
+"""
+RepeatRangeStatement is a counted loop, identifier goes from start up to end (end excluded) and end is
+evaluated once before the loop. It becomes a single Neko while with the increment in the condition
+e.g:
+repeat i in 0..n { echoln(i); }
+"""
+class RepeatRangeStatement(AST):
+	__slots__ = ("identifier", "start", "end", "body")
+
+	def __init__(self, identifier: Identifier, start: AST, end: AST, body: BlockStatement):
+		self.identifier = identifier
+		self.start = start
+		self.end = end
+		self.body = body
+
+	def string(self):
+		return f"repeat {self.identifier} in {self.start}..{self.end} {self.body}"
+
+	def as_neko(self):
+		return render(self)
+
+	def emit(self, sink):
+		name = self.identifier.as_neko()
+		if isinstance(self.start, Value) and self.start.type == TokenTypes.TOK_INT:
+			start = str(int(self.start.value) - 1)
+		else:
+			start = f"({self.start.as_neko()}) - 1"
+		# A literal end doesn't need to be kept in a variable, the others are evaluated before the counter is declared
+		end = self.end.as_neko() if isinstance(self.end, Value) else LOOP_END
+		sink.write("{\n")
+		if end == LOOP_END:
+			sink.write(f"var {LOOP_END} = {self.end.as_neko()};\n")
+		sink.write(f"var {name} = {start};\nwhile (({name} += 1) < {end}) ")
+		self.body.emit(sink)
+		sink.write("\n}")
+
+"""
+RepeatEachStatement runs its body for every item of an array, the array and its size are evaluated once
+e.g:
+repeat user in users { echoln(user["name"]); }
+"""
+class RepeatEachStatement(AST):
+	__slots__ = ("identifier", "items", "body")
+
+	def __init__(self, identifier: Identifier, items: AST, body: BlockStatement):
+		self.identifier = identifier
+		self.items = items
+		self.body = body
+
+	def string(self):
+		return f"repeat {self.identifier} in {self.items} {self.body}"
+
+	def as_neko(self):
+		return render(self)
+
+	def emit(self, sink):
+		sink.write(f"{{\nvar {LOOP_ITEMS} = {self.items.as_neko()};\nvar {LOOP_END} = $asize({LOOP_ITEMS});\nvar {LOOP_INDEX} = -1;\n")
+		sink.write(f"while (({LOOP_INDEX} += 1) < {LOOP_END}) {{\nvar {self.identifier.as_neko()} = {LOOP_ITEMS}[{LOOP_INDEX}];\n")
+		self.body.emit(sink)
+		sink.write("\n}\n}")
 
 class BreakStatement(AST):
+	__slots__ = ()
+
 	def string(self):
 		return "break"
 
@@ -264,6 +474,8 @@ class BreakStatement(AST):
 		return self.string() + ";"
 
 class ContinueStatement(AST):
+	__slots__ = ()
+
 	def string(self):
 		return "continue"
 
@@ -271,6 +483,8 @@ class ContinueStatement(AST):
 		return self.string() + ";"
 
 class IfStatement(AST):
+	__slots__ = ("condition", "todo", "alternate")
+
 	def __init__(self, condition: Operation, todo: BlockStatement, alternate: BlockStatement):
 		self.condition = condition
 		self.todo = todo
@@ -280,16 +494,75 @@ class IfStatement(AST):
 		return f"if ({self.condition}) {self.todo.as_neko()} else {self.alternate.as_neko()}"
 
 	def as_neko(self):
-		return self.string()
+		return render(self)
+
+	def emit(self, sink):
+		sink.write(f"if ({self.condition.as_neko()}) ")
+		self.todo.emit(sink)
+		sink.write(" else ")
+		self.alternate.emit(sink)
+
+# The names of the fields of a node class, the slots of the class and of its bases
+@cache
+def fields(cls: type):
+	names = []
+	for klass in reversed(cls.__mro__):
+		names.extend(klass.__dict__.get("__slots__", ()))
+	return tuple(names)
+
+# The nodes that are directly inside a node
+def children(node: AST):
+	for name in fields(type(node)):
+		value = getattr(node, name)
+		if isinstance(value, AST):
+			yield value
+		elif isinstance(value, list):
+			for item in value:
+				if isinstance(item, AST):
+					yield item
+
+# Every node under node (and node itself), parents before their children. The nodes are walked
+# with an explicit stack because operations can be chained deeper than the recursion limit
+def walk(node: AST):
+	stack = [node]
+	while stack:
+		current = stack.pop()
+		yield current
+		stack.extend(children(current))
+
+def emit(node: AST, sink):
+	node.emit(sink)
+
+# The Neko code of a node as a string
+def render(node: AST):
+	sink = io.StringIO()
+	node.emit(sink)
+	return sink.getvalue()
 
 INDEXING_TOKENS = [ TokenTypes.TOK_INT, TokenTypes.TOK_STRING, TokenTypes.TOK_IDENTIFIER ]
 LITERALS = [ TokenTypes.TOK_INT, TokenTypes.TOK_FLOAT, TokenTypes.TOK_TRUE, TokenTypes.TOK_FALSE, TokenTypes.TOK_STRING ]
 OPERATORS = [ TokenTypes.TOK_PLUS, TokenTypes.TOK_MINUS, TokenTypes.TOK_ASTERISK, TokenTypes.TOK_SLASH, TokenTypes.TOK_EQ, TokenTypes.TOK_NEQ, TokenTypes.TOK_GT, TokenTypes.TOK_GTE, TokenTypes.TOK_LT, TokenTypes.TOK_LTE ]
+# The higher binds tighter, operators with the same precedence are grouped from the left
+PRECEDENCE = {
+	TokenTypes.TOK_ASTERISK : 3,
+	TokenTypes.TOK_SLASH : 3,
+	TokenTypes.TOK_PLUS : 2,
+	TokenTypes.TOK_MINUS : 2,
+	TokenTypes.TOK_EQ : 1,
+	TokenTypes.TOK_NEQ : 1,
+	TokenTypes.TOK_GT : 1,
+	TokenTypes.TOK_GTE : 1,
+	TokenTypes.TOK_LT : 1,
+	TokenTypes.TOK_LTE : 1,
+}
 
 class Parser:
-	def __init__(self, tokens: list[Token]):
+	# filename is the name of the file in the errors, the errors also tell the line and the column
+	# of the token that failed when the tokens are in a TokenStream
+	def __init__(self, tokens: list[Token]|TokenStream, filename: str = "<source>"):
 		self.current = 0
 		self.tokens = tokens
+		self.filename = filename
 		self.in_func_state = 0 # This will check if we are in a function or not
 		self.in_loop_state = 0
 		self.in_if_state = 0
@@ -298,15 +571,33 @@ class Parser:
 
 		self.call_a_func = 0 # This will check if we are calling a function or not
 
-	def parse_ast(self):
+	# With a NodeStore every top level statement is packed into the store as soon as it's parsed
+	# and the store is returned instead of a Program
+	def parse_ast(self, store: NodeStore|None = None):
 		programAST = Program([])
 		while self.current < len(self.tokens):
-			res = self.walk()
-			programAST.body.append(res)
-		return programAST
+			try:
+				res = self.walk()
+			except AttributeError:
+				# The walk went past the last token, e.g a block without its }
+				if self.ctoken is not None:
+					raise
+				self.error("Unexpected end of the file")
+			if store is not None:
+				store.add(res)
+			else:
+				programAST.body.append(res)
+		return programAST if store is None else store
 
 	def error(self, a):
-		raise Exception(a)
+		where = self.filename
+		if isinstance(self.tokens, TokenStream) and len(self.tokens) > 0:
+			if self.current < len(self.tokens):
+				line, column = self.tokens.position(self.current)
+			else:
+				line, column = self.tokens.location(self.tokens.end(len(self.tokens) - 1))
+			where += f":{line}:{column}"
+		raise Exception(f"{where}: {a}")
 
 	def next_token(self):
 		self.current += 1
@@ -334,6 +625,80 @@ class Parser:
 			return None
 		return self.tokens[self.current - 1]
 	
+	def walk_literal(self):
+		res = Value(self.ctoken)
+		self.next_token()
+		return res
+
+	# The identifier can be followed by an assignment, function calls or indexing
+	def walk_identifier(self):
+		res = Identifier(self.ctoken)
+		self.next_token()
+
+		# This part will handle assignment
+		if self.ctoken.type == TokenTypes.TOK_ASSIGN:
+			res = self.walk_assignment(res)
+		# This part will handle function calls
+		elif self.ctoken.type == TokenTypes.TOK_LPAREN:
+			self.call_a_func += 1
+			func_args = []
+			while self.ctoken.type == TokenTypes.TOK_LPAREN:
+				func_args.append(self.walk())
+			res = FunctionCall(res, func_args)
+			self.call_a_func -= 1
+		# This will check whether we are currently indexing an array/hashmap or defining an array
+		elif self.ctoken.type == TokenTypes.TOK_LBRACKET and self.ntoken.type in INDEXING_TOKENS and self.xntoken(2).type == TokenTypes.TOK_RBRACKET:
+			indexing_args = []
+			while self.ctoken.type == TokenTypes.TOK_LBRACKET and self.ntoken.type in INDEXING_TOKENS and self.xntoken(2).type == TokenTypes.TOK_RBRACKET:
+				self.next_token() # This will skip the [
+				indexing_args.append(self.walk()) # This will parse the next token whether it's a value or identifier
+				self.next_token() # This will skip the ]
+			res = Indexing(res, indexing_args)
+			# Setting an item of an array or a hashmap
+			if self.ctoken.type == TokenTypes.TOK_ASSIGN:
+				res = self.walk_assignment(res)
+		else:
+			pass
+
+		return res
+
+	def walk_assignment(self, left: Identifier|Indexing):
+		self.next_token() # Skip the =
+		start = self.current
+		r = self.walk()
+		if not isinstance(r, (Value, Identifier, ArrayList, HashMap, FunctionCall, Operation)):
+			self.current = start # The error tells where the value starts
+			self.error("Invalid syntax")
+		return ValueDefinition(left, r)
+
+	# Operands of an operation are literals, identifiers (with their calls or indexing) or anything walk can parse
+	def walk_operand(self):
+		if self.ctoken.type in LITERALS:
+			return self.walk_literal()
+		if self.ctoken.type == TokenTypes.TOK_IDENTIFIER:
+			return self.walk_identifier()
+		return self.walk()
+
+	# Parse a chain of operations with precedence climbing. The pending operators and operands are kept
+	# in explicit stacks so a long chain doesn't recurse, e.g a + b * c - d becomes ((a + (b * c)) - d)
+	def walk_operation(self, left: AST):
+		operands = [left]
+		operators = []
+		token = self.ctoken
+		while token is not None and token.type in PRECEDENCE:
+			precedence = PRECEDENCE[token.type]
+			while operators and operators[-1][0] >= precedence:
+				right = operands.pop()
+				operands[-1] = Operation(operands[-1], operators.pop()[1], right)
+			operators.append((precedence, token))
+			self.next_token() # Skip the operator
+			operands.append(self.walk_operand())
+			token = self.ctoken
+		while operators:
+			right = operands.pop()
+			operands[-1] = Operation(operands[-1], operators.pop()[1], right)
+		return operands[0]
+
 	# Walk return none by default that means it's error
 	# If it's not returning None then the current token should change to be the next token
 	def walk(self):
@@ -342,12 +707,9 @@ class Parser:
 			return Empty()
 
 		if self.ctoken.type in LITERALS:
-			res = Value(self.ctoken)
-			self.next_token()
+			res = self.walk_literal()
 			if self.ctoken.type in OPERATORS:
-				op = self.ctoken
-				self.next_token()
-				res = Operation(res, op, self.walk())
+				res = self.walk_operation(res)
 			return res
 
 		if self.ctoken.type == TokenTypes.TOK_LBRACKET:
@@ -389,40 +751,9 @@ class Parser:
 
 		# Identifier
 		if self.ctoken.type == TokenTypes.TOK_IDENTIFIER:
-			res = Identifier(self.ctoken)
-			self.next_token()
-
-			# This part will handle operations
+			res = self.walk_identifier()
 			if self.ctoken.type in OPERATORS:
-				op = self.ctoken
-				self.next_token() # Skip the operator
-				res = Operation(res, op, self.walk())
-			# This part will handle assignment
-			elif self.ctoken.type == TokenTypes.TOK_ASSIGN:
-				self.next_token()
-				r = self.walk()
-				if not isinstance(r, (Value, Identifier, ArrayList, HashMap, FunctionCall, Operation)):
-					self.error("Invalid syntax")
-				res = ValueDefinition(res, r)
-			# This part will handle function calls
-			elif self.ctoken.type == TokenTypes.TOK_LPAREN:
-				self.call_a_func += 1
-				func_args = []
-				while self.ctoken.type == TokenTypes.TOK_LPAREN:
-					func_args.append(self.walk())
-				res = FunctionCall(res, func_args)
-				self.call_a_func -= 1
-			# This will check whether we are currently indexing an array/hashmap or defining an array
-			elif self.ctoken.type == TokenTypes.TOK_LBRACKET and self.ntoken.type in INDEXING_TOKENS and self.xntoken(2).type == TokenTypes.TOK_RBRACKET:
-				indexing_args = []
-				while self.ctoken.type == TokenTypes.TOK_LBRACKET and self.ntoken.type in INDEXING_TOKENS and self.xntoken(2).type == TokenTypes.TOK_RBRACKET:
-					self.next_token() # This will skip the [
-					indexing_args.append(self.walk()) # This will parse the next token whether it's a value or identifier
-					self.next_token() # This will skip the ]
-				res = Indexing(res, indexing_args)
-			else:
-				pass
-
+				res = self.walk_operation(res)
 			return res
 
 		if self.ctoken.type == TokenTypes.TOK_RETURN:
@@ -499,13 +830,28 @@ class Parser:
 
 		if self.ctoken.type == TokenTypes.TOK_REPEAT:
 			self.next_token() # Just skip the repeat keyword
+			# repeat i in 0..n or repeat item in items, in is only a keyword there so it can still name a variable
+			identifier = None
+			if self.ctoken.type == TokenTypes.TOK_IDENTIFIER and self.ntoken.type == TokenTypes.TOK_IDENTIFIER and self.ntoken.literal == "in":
+				identifier = Identifier(self.ctoken)
+				self.next_token()
+				self.next_token() # Skip in
+				start = self.walk()
+				end = None
+				if self.ctoken.type == TokenTypes.TOK_DOTDOT:
+					self.next_token()
+					end = self.walk()
 			if self.ctoken.type != TokenTypes.TOK_LBRACE:
 				self.error("Repeat statement error")
 				
 			self.in_loop_state += 1
 			body = self.walk()
 			self.in_loop_state -= 1
-			return RepeatStatement(body)
+			if identifier is None:
+				return RepeatStatement(body)
+			if end is None:
+				return RepeatEachStatement(identifier, start, body)
+			return RepeatRangeStatement(identifier, start, end, body)
 
 		if self.ctoken.type == TokenTypes.TOK_IF:
 			self.next_token() # Just skip the if keyword
@@ -547,6 +893,8 @@ class Parser:
 				self.error("Invalid token after variable definition expecting an identifier")
 			self.next_token() # pass the var keyword
 			res = self.walk() # Get the identifier
+			if isinstance(res, Indexing) or isinstance(res, ValueDefinition) and isinstance(res.left, Indexing):
+				self.error("Only a variable can be declared, not an item of an array or a hashmap")
 			if isinstance(res, ValueDefinition):
 				res = VariableInitialization(res)
 				self.variables.append(res.vardec)
@@ -555,4 +903,5 @@ class Parser:
 				self.variables.append(res)
 			return res
 
-		return None
\ No newline at end of file
+		# Nothing starts with this token, the loops that walk until a closing token would never end
+		self.error(f"Unexpected token {self.ctoken.literal!r}")
\ No newline at end of file
@@ -1,10 +1,21 @@
+from __future__ import annotations
+
+SEPARATOR = "\n\n"
+
+"""
+Bundler joins sources into one text, every source is followed by a blank line. The sources are
+only joined once when the bundle is needed (or streamed to a sink), so bundling is linear in the
+size of the sources, e.g:
+bundler.write_to(output)
+"""
 class Bundler:
 	def __init__(self):
-		self._writer = ""
 		self.sources = []
+		self._bundled = None
 
 	def _write(self, text: str):
 		self.sources.append(text)
+		self._bundled = None
 
 	def from_file(self, filepath: str):
 		with open(filepath, "r") as file:
@@ -17,18 +28,24 @@ class Bundler:
 		for f in filepaths:
 			self.from_file(f)
 
+	# With cache the joined bundle is kept until another source is added
 	def bundle(self, cache=False):
-		writer = self._writer
-		for source in self.sources:
-			writer += source + "\n\n"
+		if self._bundled is not None:
+			return self._bundled
+		bundled = "".join(part for source in self.sources for part in (source, SEPARATOR))
 		if cache:
-			self._writer = writer
-			self.sources = []
-		return writer
+			self._bundled = bundled
+		return bundled
 
 	def get_bundled(self):
 		return self.bundle(cache=False)
 
+	# Write the bundle to a file-like sink without joining the sources first
+	def write_to(self, sink):
+		for source in self.sources:
+			sink.write(source)
+			sink.write(SEPARATOR)
+
 	def save_to(self, filepath: str):
 		with open(filepath, "w") as file:
-			file.write(self.get_bundled())
\ No newline at end of file
+			self.write_to(file)
@@ -0,0 +1,777 @@
+from __future__ import annotations
+import re
+import struct
+from typing import Iterable
+
+from . import ast
+from .ast import field_hash
+from .token import TokenTypes
+
+"""
+The NekoVM module format (.n) written without nekoc. The program is compiled from the Ramen AST and the runtime
+(builtins.neko) from its Neko source, to the same bytecode that nekoc makes for the Neko code of a build:
+"NEKO", the number of globals, of fields and of code ints, the globals (variables, functions, strings and floats),
+the names of the fields and the code. The code is a list of ints, an opcode and for most of them a parameter.
+The module has no debug infos (the file and the line of every code int): the Ramen nodes don't know their line, so
+the errors of a module don't tell where they happen, e.g:
+module = compile_module([NekoParser(runtime).parse()], [program.body])
+"""
+
+OPCODES = [
+	"AccNull", "AccTrue", "AccFalse", "AccThis", "AccInt", "AccStack", "AccGlobal", "AccEnv", "AccField", "AccArray",
+	"AccIndex", "AccBuiltin", "SetStack", "SetGlobal", "SetEnv", "SetField", "SetArray", "SetIndex", "SetThis", "Push",
+	"Pop", "Call", "ObjCall", "Jump", "JumpIf", "JumpIfNot", "Trap", "EndTrap", "Ret", "MakeEnv", "MakeArray", "Bool",
+	"IsNull", "IsNotNull", "Add", "Sub", "Mult", "Div", "Mod", "Shl", "Shr", "UShr", "Or", "And", "Xor", "Eq", "Neq",
+	"Gt", "Gte", "Lt", "Lte", "Not", "TypeOf", "Compare", "Hash", "New", "JumpTable", "Apply", "AccStack0", "AccStack1",
+	"AccIndex0", "AccIndex1", "PhysCompare", "TailCall",
+]
+OP = { name : code for code, name in enumerate(OPCODES) }
+
+GLOBAL_VAR, GLOBAL_FUNCTION, GLOBAL_STRING, GLOBAL_FLOAT = range(1, 5)
+
+BINARY_OPS = {
+	"+" : OP["Add"], "-" : OP["Sub"], "*" : OP["Mult"], "/" : OP["Div"], "%" : OP["Mod"],
+	"==" : OP["Eq"], "!=" : OP["Neq"], ">" : OP["Gt"], ">=" : OP["Gte"], "<" : OP["Lt"], "<=" : OP["Lte"],
+}
+# The builtins that are an opcode when they are called with one argument
+UNARY_BUILTINS = { "typeof" : OP["TypeOf"], "hash" : OP["Hash"], "new" : OP["New"], "istrue" : OP["Bool"], "not" : OP["Not"] }
+# The builtins that are constants ($typeof gives them)
+TYPE_CONSTANTS = { "tnull" : 0, "tint" : 1, "tfloat" : 2, "tbool" : 3, "tstring" : 4, "tobject" : 5, "tarray" : 6, "tfunction" : 7, "tabstract" : 8 }
+# A call with more arguments goes through $call with an array of the arguments
+MAX_CALL_ARGS = 5
+
+"""
+The Neko code is compiled from a small tree of tuples, the first item is the kind of the node:
+("int", 1) ("float", "1.5") ("string", b"text") ("true",) ("false",) ("null",) ("this",)
+("ident", name) ("builtin", name) ("var", name, value|None) ("block", [nodes])
+("set", target, value) where target is an ident, field or index node
+("field", object, name) ("index", array, key) ("call", function, [arguments]) ("binop", op, left, right)
+("not", value) ("neg", value) ("if", condition, then, else|None) ("while", condition, body)
+("break",) ("continue",) ("return", value|None) ("function", [params], body) ("object", [(name, value)])
+"""
+
+# --- The Neko source of the runtime
+
+NEKO_TOKEN = re.compile(r"""
+	(?P<skip>\s+|//[^\n]*|/\*.*?\*/)
+	|(?P<string>"(?:\\.|[^"\\])*")
+	|(?P<float>\d+\.\d*)
+	|(?P<int>\d+)
+	|(?P<name>\$?[A-Za-z_]\w*)
+	|(?P<symbol>=>|[=!<>+\-*/%]=|[-+*/%<>=!(){}\[\],;.])
+""", re.VERBOSE | re.DOTALL)
+NEKO_ESCAPES = { "n" : b"\n", "t" : b"\t", "r" : b"\r", "\\" : b"\\", "\"" : b"\"" }
+NEKO_PRECEDENCE = { "==" : 1, "!=" : 1, ">" : 1, ">=" : 1, "<" : 1, "<=" : 1, "+" : 2, "-" : 2, "*" : 3, "/" : 3, "%" : 4 }
+ASSIGNMENTS = ["=", "+=", "-=", "*=", "/=", "%="]
+
+def unescape(text: str):
+	# The bytes of the text of a Neko string (without the quotes), \n \t \r \\ \" and \ddd (decimal)
+	# Like nekoc, \ddd is one byte and the other characters are their UTF-8 bytes, e.g "\233" isn't "é"
+	if "\\" not in text:
+		return text.encode()
+	writer = bytearray()
+	i = 0
+	while i < len(text):
+		escape = text.find("\\", i)
+		if escape < 0 or escape + 1 == len(text):
+			writer += text[i:].encode()
+			break
+		writer += text[i:escape].encode()
+		n = text[escape + 1]
+		digits = text[escape + 1:escape + 4]
+		if n in NEKO_ESCAPES:
+			writer += NEKO_ESCAPES[n]
+			i = escape + 2
+		elif len(digits) == 3 and digits.isdigit() and int(digits) <= 0xFF:
+			writer.append(int(digits))
+			i = escape + 4
+		else:
+			raise Exception(f"Invalid escape sequence \\{n} in a Neko string")
+	return bytes(writer)
+
+class NekoParser:
+	"""
+	Parse the Neko code of the runtime into the tree that the compiler takes. It only knows the part of Neko that
+	the runtime is written with: functions, var, if, while, return, break, continue, calls, fields, indexes,
+	objects and the binary operators. Returns a list of (line, node) for the top level expressions
+	"""
+	def __init__(self, source: str):
+		self.tokens = [] # (kind, text, line)
+		line = 1
+		position = 0
+		while position < len(source):
+			match = NEKO_TOKEN.match(source, position)
+			if match is None:
+				raise Exception(f"Invalid Neko code at line {line}: {source[position:position + 20]!r}")
+			if match.lastgroup != "skip":
+				self.tokens.append((match.lastgroup, match.group(), line))
+			line += match.group().count("\n")
+			position = match.end()
+		self.current = 0
+
+	def peek(self, offset: int = 0):
+		i = self.current + offset
+		return self.tokens[i] if i < len(self.tokens) else (None, None, None)
+
+	def accept(self, text: str):
+		if self.peek()[1] == text and self.peek()[0] in ("symbol", "name"):
+			self.current += 1
+			return True
+		return False
+
+	def expect(self, text: str):
+		if not self.accept(text):
+			raise Exception(f"Expecting {text!r} in the Neko code at line {self.peek()[2]}, found {self.peek()[1]!r}")
+
+	def parse(self):
+		program = []
+		while self.current < len(self.tokens):
+			line = self.peek()[2]
+			program.append((line, self.expression()))
+			self.accept(";")
+		return program
+
+	def expression(self):
+		left = self.binary(0)
+		if self.peek()[0] == "symbol" and self.peek()[1] in ASSIGNMENTS:
+			op = self.peek()[1]
+			self.current += 1
+			value = self.expression()
+			if op != "=":
+				value = ("binop", op[0], left, value)
+			return ("set", left, value)
+		return left
+
+	def binary(self, precedence: int):
+		left = self.unary()
+		while True:
+			kind, text, _ = self.peek()
+			if kind != "symbol" or text not in NEKO_PRECEDENCE or NEKO_PRECEDENCE[text] < precedence:
+				return left
+			self.current += 1
+			left = ("binop", text, left, self.binary(NEKO_PRECEDENCE[text] + 1))
+
+	def unary(self):
+		if self.accept("-"):
+			value = self.unary()
+			return ("int", -value[1]) if value[0] == "int" else ("neg", value)
+		if self.accept("!"):
+			return ("not", self.unary())
+		return self.postfix(self.primary())
+
+	def postfix(self, node: tuple):
+		while True:
+			if self.accept("("):
+				node = ("call", node, self.arguments(")"))
+			elif self.accept("["):
+				key = self.expression()
+				self.expect("]")
+				node = ("index", node, key)
+			elif self.accept("."):
+				node = ("field", node, self.name())
+			else:
+				return node
+
+	def arguments(self, closing: str):
+		arguments = []
+		while not self.accept(closing):
+			arguments.append(self.expression())
+			if not self.accept(","):
+				self.expect(closing)
+				break
+		return arguments
+
+	def name(self):
+		kind, text, line = self.peek()
+		if kind != "name":
+			raise Exception(f"Expecting a name in the Neko code at line {line}")
+		self.current += 1
+		return text
+
+	def block(self):
+		body = []
+		while not self.accept("}"):
+			body.append(self.expression())
+			self.accept(";")
+		return ("block", body)
+
+	def primary(self):
+		kind, text, line = self.peek()
+		self.current += 1
+		if kind == "int":
+			return ("int", int(text))
+		if kind == "float":
+			return ("float", text)
+		if kind == "string":
+			return ("string", unescape(text[1:-1]))
+		if kind == "symbol":
+			if text == "(":
+				node = self.expression()
+				self.expect(")")
+				return node
+			if text == "{":
+				if self.peek()[0] == "name" and self.peek(1)[1] == "=>":
+					pairs = []
+					while not self.accept("}"):
+						name = self.name()
+						self.expect("=>")
+						pairs.append((name, self.expression()))
+						self.accept(",")
+					return ("object", pairs)
+				return self.block()
+		if kind == "name":
+			if text in ("true", "false", "null", "this"):
+				return (text,)
+			if text == "var":
+				name = self.name()
+				return ("var", name, self.expression() if self.accept("=") else None)
+			if text == "if":
+				condition = self.expression()
+				then = self.expression()
+				if self.peek()[1] == ";" and self.peek(1)[1] == "else":
+					self.current += 1
+				alternate = self.expression() if self.accept("else") else None
+				return ("if", condition, then, alternate)
+			if text == "while":
+				return ("while", self.expression(), self.expression())
+			if text == "return":
+				if self.peek()[1] in (";", "}"):
+					return ("return", None)
+				return ("return", self.expression())
+			if text in ("break", "continue"):
+				return (text,)
+			if text == "function":
+				self.expect("(")
+				params = []
+				while not self.accept(")"):
+					params.append(self.name())
+					self.accept(",")
+				return ("function", params, self.expression())
+			if text.startswith("$"):
+				return ("builtin", text[1:])
+			return ("ident", text)
+		raise Exception(f"Unsupported Neko code at line {line}: {text!r}")
+
+# --- The Ramen AST
+
+def lower_value(node: ast.Value):
+	if node.type == TokenTypes.TOK_INT:
+		return ("int", int(node.value))
+	if node.type == TokenTypes.TOK_FLOAT:
+		return ("float", node.value)
+	if node.type == TokenTypes.TOK_STRING:
+		return ("string", unescape(node.value))
+	return ("true",) if node.value == "true" else ("false",)
+
+def lower_name(name: str):
+	# The inlined builtins are called by their Neko name, e.g $print
+	return ("builtin", name[1:]) if name.startswith("$") else ("ident", name)
+
+def lower_key(base: tuple, key: ast.Value|ast.Identifier, plain: bool, value: tuple|None = None):
+	# The same specialization as ast.key_neko: a string literal is a field, an integer an index and the
+	# other keys check their type at run time
+	if isinstance(key, ast.Value) and key.type == TokenTypes.TOK_STRING:
+		access = ("field", base, unescape(key.value))
+	elif isinstance(key, ast.Value):
+		access = ("index", base, lower(key))
+	elif plain:
+		k = lower(key)
+		is_int = ("binop", "==", ("call", ("builtin", "typeof"), [k]), ("builtin", "tint"))
+		field = ("call", ("builtin", "hash"), [k])
+		if value is None:
+			return ("if", is_int, ("index", base, k), ("call", ("builtin", "objget"), [base, field]))
+		return ("if", is_int, ("set", ("index", base, k), value), ("call", ("builtin", "objset"), [base, field, value]))
+	else:
+		if value is None:
+			return ("call", ("ident", ast.INDEX), [base, lower(key)])
+		return ("call", ("ident", ast.SET_INDEX), [base, lower(key), value])
+	return access if value is None else ("set", access, value)
+
+def lower_indexing(node: ast.Indexing, value: tuple|None = None):
+	writer = lower(node.identifier)
+	for i, arg in enumerate(node.args):
+		last = i == len(node.args) - 1
+		writer = lower_key(writer, arg, i == 0, value if last else None)
+	return writer
+
+def lower_call(node: ast.FunctionCall):
+	writer = lower(node.identifier)
+	for args in node.arguments:
+		writer = ("call", writer, [lower(a) for a in args.arguments])
+	return writer
+
+def lower_definition(node: ast.ValueDefinition):
+	if isinstance(node.left, ast.Indexing):
+		return lower_indexing(node.left, lower(node.right))
+	return ("set", lower(node.left), lower(node.right))
+
+def lower_operation(node: ast.Operation):
+	# Operations are chained on their left, the chain is walked instead of recursed into (see Operation.join)
+	rights = []
+	while isinstance(node, ast.Operation):
+		rights.append(node)
+		node = node.left
+	writer = lower(node)
+	for operation in reversed(rights):
+		writer = ("binop", operation.op, writer, lower(operation.right))
+	return writer
+
+def lower_range(node: ast.RepeatRangeStatement):
+	name = node.identifier.name
+	if isinstance(node.start, ast.Value) and node.start.type == TokenTypes.TOK_INT:
+		start = ("int", int(node.start.value) - 1)
+	else:
+		start = ("binop", "-", lower(node.start), ("int", 1))
+	body = []
+	if isinstance(node.end, ast.Value):
+		end = lower(node.end)
+	else:
+		body.append(("var", ast.LOOP_END, lower(node.end)))
+		end = ("ident", ast.LOOP_END)
+	counter = ("ident", name)
+	body.append(("var", name, start))
+	body.append(("while", ("binop", "<", ("set", counter, ("binop", "+", counter, ("int", 1))), end), lower(node.body)))
+	return ("block", body)
+
+def lower_each(node: ast.RepeatEachStatement):
+	items, end, index = ("ident", ast.LOOP_ITEMS), ("ident", ast.LOOP_END), ("ident", ast.LOOP_INDEX)
+	return ("block", [
+		("var", ast.LOOP_ITEMS, lower(node.items)),
+		("var", ast.LOOP_END, ("call", ("builtin", "asize"), [items])),
+		("var", ast.LOOP_INDEX, ("int", -1)),
+		("while", ("binop", "<", ("set", index, ("binop", "+", index, ("int", 1))), end), ("block", [
+			("var", node.identifier.name, ("index", items, index)),
+			lower(node.body),
+		])),
+	])
+
+LOWERINGS = {
+	ast.Program : lambda node: ("block", [lower(b) for b in node.body]),
+	ast.Value : lower_value,
+	ast.Identifier : lambda node: lower_name(node.name),
+	ast.ArrayList : lambda node: ("call", ("builtin", "array"), [lower(item) for item in node.items]),
+	ast.HashMap : lambda node: ("object", [(pair.left.name, lower(pair.right)) for pair in node.pairs]),
+	ast.Indexing : lower_indexing,
+	ast.HashMapIndexing : lower_indexing,
+	ast.VariableDeclaration : lambda node: ("var", node.identifier.name, None),
+	ast.ValueDefinition : lower_definition,
+	ast.VariableInitialization : lambda node: ("var", node.valuedef.left.name, lower(node.valuedef.right)),
+	ast.BlockStatement : lambda node: ("block", [lower(b) for b in node.body]),
+	ast.FunctionCall : lower_call,
+	# A named function is a global of the module, see FunctionDefinition.emit
+	ast.FunctionDefinition : lambda node: ("set", ("ident", node.identifier.name), ("function", [p.name for p in node.params], lower(node.body))),
+	ast.LambdaFunction : lambda node: ("function", [p.name for p in node.params], lower(node.body)),
+	ast.ReturnStatemnt : lambda node: ("return", lower(node.value)),
+	ast.Operation : lower_operation,
+	ast.Empty : lambda node: ("block", []),
+	ast.Package : lambda node: lower(node.body),
+	ast.RepeatStatement : lambda node: ("while", ("true",), lower(node.body)),
+	ast.BreakStatement : lambda node: ("break",),
+	ast.ContinueStatement : lambda node: ("continue",),
+	ast.IfStatement : lambda node: ("if", lower(node.condition), lower(node.todo), lower(node.alternate) if node.alternate.body else None),
+	ast.RepeatRangeStatement : lower_range,
+	ast.RepeatEachStatement : lower_each,
+}
+
+def lower(node: ast.AST):
+	# The tree of the Neko code of a Ramen node, it does what the Neko code of as_neko does
+	return LOWERINGS[type(node)](node)
+
+# --- The bytecode
+
+class Code:
+	# The code of a function, the jumps are relative so it can be moved
+	def __init__(self, module: Module):
+		self.module = module
+		self.code = []
+
+	def emit(self, op: int, param: int|None = None):
+		self.code.append(op)
+		if param is not None:
+			self.code.append(param)
+		return len(self.code) - 1
+
+	def patch(self, jump: int, target: int|None = None):
+		# jump is the index of the parameter of a jump, jumps are relative to their opcode
+		self.code[jump] = (len(self.code) if target is None else target) - (jump - 1)
+
+class Module:
+	"""
+	The globals, the fields and the code of a module. Like nekoc, the code of every function is added after
+	the functions that are done before it (the functions it contains come first) and the top level code is
+	after all of them, with a jump over the functions at the start of the module
+	"""
+	def __init__(self):
+		self.globals = [] # (kind, value)
+		self.global_ids = {}
+		self.fields = {} # The names of the fields (and the builtins) used by the code
+		self.functions = Code(self)
+
+	def global_id(self, kind: int, value):
+		# Variables, strings and floats are only added once, every function has its own global
+		key = (kind, value)
+		if kind != GLOBAL_FUNCTION and key in self.global_ids:
+			return self.global_ids[key]
+		self.globals.append(key)
+		self.global_ids[key] = len(self.globals) - 1
+		return len(self.globals) - 1
+
+	def field(self, name: str|bytes):
+		# The fields of string keys are bytes like the strings (see unescape)
+		name = name.encode() if isinstance(name, str) else name
+		self.fields.setdefault(name, field_hash(name))
+		return self.fields[name]
+
+	def add_function(self, code: Code, nargs: int):
+		# Returns the global of the function
+		start = len(self.functions.code)
+		self.functions.code.extend(code.code)
+		return self.global_id(GLOBAL_FUNCTION, (start, nargs))
+
+	def link(self, toplevel: Code):
+		# The code of the whole module, the functions are moved after the jump over them
+		if not self.functions.code:
+			return toplevel.code, 0
+		size = len(self.functions.code) + 2
+		return [OP["Jump"], size] + self.functions.code + toplevel.code, 2
+
+	def write(self, toplevel: Code):
+		code, offset = self.link(toplevel)
+		out = bytearray(b"NEKO")
+		out += struct.pack("<iii", len(self.globals), len(self.fields), len(code))
+		for kind, value in self.globals:
+			out.append(kind)
+			if kind == GLOBAL_VAR or kind == GLOBAL_FLOAT:
+				out += value.encode() + b"\0"
+			elif kind == GLOBAL_FUNCTION:
+				out += struct.pack("<i", (value[0] + offset) | (value[1] << 24))
+			else:
+				if len(value) > 0xFFFF:
+					raise Exception("A string of the program is too long for a Neko module")
+				out += struct.pack("<H", len(value)) + value
+		for name in self.fields:
+			out += name + b"\0"
+		i = 0
+		while i < len(code):
+			op = code[i]
+			if not HAS_PARAM[op]:
+				out.append(op << 2)
+				i += 1
+				continue
+			param = code[i + 1]
+			if op < 32 and param in (0, 1):
+				out.append((op << 3) | (param << 2) | 1)
+			elif 0 <= param <= 0xFF:
+				out += bytes(((op << 2) | 2, param))
+			else:
+				out.append((op << 2) | 3)
+				out += struct.pack("<i", param)
+			i += 2
+		return bytes(out)
+
+# The opcodes that have a parameter
+HAS_PARAM = [name in (
+	"AccInt", "AccStack", "AccGlobal", "AccEnv", "AccField", "AccIndex", "AccBuiltin", "SetStack", "SetGlobal", "SetEnv",
+	"SetField", "SetIndex", "Pop", "Call", "ObjCall", "Jump", "JumpIf", "JumpIfNot", "Trap", "Ret", "MakeEnv", "MakeArray",
+	"JumpTable", "Apply", "TailCall",
+) for name in OPCODES]
+
+class FunctionCompiler:
+	"""
+	Compile the body of a function (or the top level of the module) into the code of the module. The arguments
+	and the variables are on the stack, the variables of the enclosing functions are copied into the environment
+	of the function when it's created (that's how Neko closures capture them) and the other names are globals
+	"""
+	def __init__(self, module: Module, parent: FunctionCompiler|None = None, params: list[str]|None = None):
+		self.module = module
+		self.parent = parent
+		self.params = params or []
+		self.locals = { name : slot for slot, name in enumerate(self.params) } # The name of a variable to its stack slot
+		self.stack = len(self.params)
+		self.code = Code(module)
+		self.env = [] # The names of the captured variables
+		self.loops = [] # (stack, start, breaks) of the loops the code is in
+
+	def emit(self, op: str, param: int|None = None):
+		return self.code.emit(OP[op], param)
+
+	def declared(self, name: str):
+		return name in self.locals or name in self.env or (self.parent is not None and self.parent.declared(name))
+
+	def resolve(self, name: str):
+		if name in self.locals:
+			return "stack", self.locals[name]
+		if name in self.env:
+			return "env", self.env.index(name)
+		if self.parent is not None and self.parent.declared(name):
+			self.env.append(name)
+			return "env", len(self.env) - 1
+		return "global", self.module.global_id(GLOBAL_VAR, name)
+
+	def access(self, name: str):
+		kind, index = self.resolve(name)
+		if kind == "stack":
+			depth = self.stack - 1 - index
+			if depth == 0:
+				self.emit("AccStack0")
+			elif depth == 1:
+				self.emit("AccStack1")
+			else:
+				# The parameter of AccStack starts at the third item, AccStack0 and AccStack1 are the first two
+				self.emit("AccStack", depth - 2)
+		elif kind == "env":
+			self.emit("AccEnv", index)
+		else:
+			self.emit("AccGlobal", index)
+
+	def push(self, node: tuple):
+		self.compile(node)
+		self.emit("Push")
+		self.stack += 1
+
+	def pop(self, count: int):
+		if count > 0:
+			self.emit("Pop", count)
+
+	def compile(self, node: tuple):
+		getattr(self, "compile_" + node[0])(node)
+
+	def compile_int(self, node: tuple):
+		self.emit("AccInt", node[1])
+
+	def compile_float(self, node: tuple):
+		self.emit("AccGlobal", self.module.global_id(GLOBAL_FLOAT, node[1]))
+
+	def compile_string(self, node: tuple):
+		self.emit("AccGlobal", self.module.global_id(GLOBAL_STRING, node[1]))
+
+	def compile_true(self, node: tuple):
+		self.emit("AccTrue")
+
+	def compile_false(self, node: tuple):
+		self.emit("AccFalse")
+
+	def compile_null(self, node: tuple):
+		self.emit("AccNull")
+
+	def compile_this(self, node: tuple):
+		self.emit("AccThis")
+
+	def compile_ident(self, node: tuple):
+		self.access(node[1])
+
+	def compile_builtin(self, node: tuple):
+		if node[1] in TYPE_CONSTANTS:
+			self.emit("AccInt", TYPE_CONSTANTS[node[1]])
+		else:
+			self.emit("AccBuiltin", self.module.field(node[1]))
+
+	def compile_block(self, node: tuple):
+		# The variables of a block are removed from the stack at its end
+		saved, stack = dict(self.locals), self.stack
+		for item in node[1]:
+			self.compile(item)
+		self.pop(self.stack - stack)
+		self.locals, self.stack = saved, stack
+
+	def compile_var(self, node: tuple):
+		self.push(node[2] if node[2] is not None else ("null",))
+		self.locals[node[1]] = self.stack - 1
+
+	def compile_set(self, node: tuple):
+		target, value = node[1], node[2]
+		if target[0] == "ident":
+			self.compile(value)
+			kind, index = self.resolve(target[1])
+			if kind == "stack":
+				self.emit("SetStack", self.stack - 1 - index)
+			elif kind == "env":
+				self.emit("SetEnv", index)
+			else:
+				self.emit("SetGlobal", index)
+		elif target[0] == "field":
+			self.push(target[1])
+			self.compile(value)
+			self.emit("SetField", self.module.field(target[2]))
+			self.stack -= 1
+		elif target[0] == "index" and target[2][0] == "int" and target[2][1] >= 0:
+			self.push(target[1])
+			self.compile(value)
+			self.emit("SetIndex", target[2][1])
+			self.stack -= 1
+		elif target[0] == "index":
+			self.push(target[2])
+			self.push(target[1])
+			self.compile(value)
+			self.emit("SetArray")
+			self.stack -= 2
+		else:
+			raise Exception(f"Can't assign to a {target[0]}")
+
+	def compile_field(self, node: tuple):
+		self.compile(node[1])
+		self.emit("AccField", self.module.field(node[2]))
+
+	def compile_index(self, node: tuple):
+		key = node[2]
+		if key[0] == "int" and key[1] >= 0:
+			self.compile(node[1])
+			if key[1] < 2:
+				self.emit("AccIndex0" if key[1] == 0 else "AccIndex1")
+			else:
+				self.emit("AccIndex", key[1] - 2)
+			return
+		self.push(node[1])
+		self.compile(key)
+		self.emit("AccArray")
+		self.stack -= 1
+
+	def compile_call(self, node: tuple, tail: bool = False):
+		# A tail call (the value of a return in a function) replaces the frame of the function, like nekoc does
+		# Returns True when the call is a tail call, the return doesn't need its Ret then
+		function, arguments = node[1], node[2]
+		if function[0] == "builtin":
+			name = function[1]
+			if name in UNARY_BUILTINS and len(arguments) == 1:
+				self.compile(arguments[0])
+				self.emit(OPCODES[UNARY_BUILTINS[name]])
+				return False
+			if name == "array" and arguments:
+				# The first item is in the accumulator, the others on the stack
+				for argument in arguments[1:]:
+					self.push(argument)
+				self.compile(arguments[0])
+				self.emit("MakeArray", len(arguments) - 1)
+				self.stack -= len(arguments) - 1
+				return False
+		if len(arguments) > MAX_CALL_ARGS:
+			return self.compile_call(("call", ("builtin", "call"), [function, ("this",), ("call", ("builtin", "array"), arguments)]), tail)
+		for argument in arguments:
+			self.push(argument)
+		self.compile(function)
+		if tail:
+			# The parameter has the number of arguments and the size of the stack to drop
+			self.emit("TailCall", len(arguments) | (self.stack << 3))
+		else:
+			self.emit("Call", len(arguments))
+		self.stack -= len(arguments)
+		return tail
+
+	def compile_binop(self, node: tuple):
+		# A chain of operations on their left is compiled from its first operand without recursing
+		chain = []
+		while node[0] == "binop":
+			chain.append(node)
+			node = node[2]
+		self.compile(node)
+		for op, _, right in (item[1:] for item in reversed(chain)):
+			self.emit("Push")
+			self.stack += 1
+			self.compile(right)
+			self.code.emit(BINARY_OPS[op])
+			self.stack -= 1
+
+	def compile_not(self, node: tuple):
+		self.compile(node[1])
+		self.emit("Not")
+
+	def compile_neg(self, node: tuple):
+		self.compile(("binop", "-", ("int", 0), node[1]))
+
+	def compile_if(self, node: tuple):
+		self.compile(node[1])
+		jump = self.emit("JumpIfNot", 0)
+		self.compile(node[2])
+		if node[3] is not None:
+			end = self.emit("Jump", 0)
+			self.code.patch(jump)
+			self.compile(node[3])
+			self.code.patch(end)
+		else:
+			self.code.patch(jump)
+
+	def compile_while(self, node: tuple):
+		start = len(self.code.code)
+		exit = None
+		if node[1] != ("true",):
+			self.compile(node[1])
+			exit = self.emit("JumpIfNot", 0)
+		breaks = []
+		self.loops.append((self.stack, start, breaks))
+		self.compile(node[2])
+		self.code.patch(self.emit("Jump", 0), start)
+		self.loops.pop()
+		if exit is not None:
+			self.code.patch(exit)
+		for jump in breaks:
+			self.code.patch(jump)
+
+	def compile_break(self, node: tuple):
+		# The variables of the blocks inside the loop are removed, the code after a jump
+		# is only reached by the other paths so the stack is kept as it is for them
+		stack, _, breaks = self.loops[-1]
+		self.pop(self.stack - stack)
+		breaks.append(self.emit("Jump", 0))
+
+	def compile_continue(self, node: tuple):
+		stack, start, _ = self.loops[-1]
+		self.pop(self.stack - stack)
+		self.code.patch(self.emit("Jump", 0), start)
+
+	def compile_return(self, node: tuple):
+		if node[1] is not None and node[1][0] == "call" and self.parent is not None:
+			if self.compile_call(node[1], True):
+				return
+		else:
+			self.compile(node[1] if node[1] is not None else ("null",))
+		self.emit("Ret", self.stack)
+
+	def compile_function(self, node: tuple):
+		function = FunctionCompiler(self.module, self, node[1])
+		function.compile(node[2])
+		function.emit("Ret", function.stack)
+		index = self.module.add_function(function.code, len(node[1]))
+		# The captured variables are copied into the environment of the closure
+		for name in function.env:
+			self.access(name)
+			self.emit("Push")
+			self.stack += 1
+		self.emit("AccGlobal", index)
+		if function.env:
+			self.emit("MakeEnv", len(function.env))
+			self.stack -= len(function.env)
+
+	def compile_object(self, node: tuple):
+		self.emit("AccNull")
+		self.emit("New")
+		self.emit("Push")
+		self.stack += 1
+		for name, value in node[1]:
+			self.emit("AccStack0")
+			self.emit("Push")
+			self.stack += 1
+			self.compile(value)
+			self.emit("SetField", self.module.field(name))
+			self.stack -= 1
+		self.emit("AccStack0")
+		self.pop(1)
+		self.stack -= 1
+
+def compile_module(runtimes: Iterable[list[tuple[int, tuple]]], programs: Iterable[Iterable[ast.AST]], entry: str = "Main"):
+	"""
+	Compile the Neko code of the runtime (the code of every file parsed by NekoParser) and the statements of
+	every Ramen file into a NekoVM module that calls entry at its end. The parsed runtime isn't changed, so it
+	can be parsed once for many modules.
+	Returns the bytes of the .n file
+	"""
+	module = Module()
+	toplevel = FunctionCompiler(module)
+	for nodes in runtimes:
+		for _, node in nodes:
+			toplevel.compile(node)
+	for statements in programs:
+		for statement in statements:
+			toplevel.compile(lower(statement))
+	toplevel.compile(("call", ("ident", entry), []))
+	toplevel.pop(toplevel.stack)
+	return module.write(toplevel.code)
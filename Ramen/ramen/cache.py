@@ -0,0 +1,95 @@
+from __future__ import annotations
+import hashlib
+import mmap
+import os
+import pickle
+from pathlib import Path
+
+from .version import __version__
+from .arena import NodeStore
+
+# Bump it when the code generation or the NodeStore layout changes without a new compiler version,
+# the files compiled by an older compiler are then compiled again
+CACHE_VERSION = 8
+CACHE_DIR = ".ramencache"
+
+"""
+CompiledFile is what the compiler keeps of one source file: the optimized statements of the file
+in a NodeStore (the tree shaker and the bytecode compiler need them, it's None when the build didn't)
+and the Neko code that they generate
+"""
+class CompiledFile:
+	__slots__ = ("key", "store", "neko")
+
+	def __init__(self, key: str, store: NodeStore, neko: str):
+		self.key = key
+		self.store = store
+		self.neko = neko
+
+"""
+BuildCache keeps a CompiledFile for every source file of a project in <project>/.ramencache,
+a file is only compiled again when the SHA-256 of its content (with the compiler version, the
+optimization level and the inlining) changed since the last build. Every source file has one entry that is
+replaced when the file changes, so the cache doesn't grow with every edit.
+A process that builds many times (e.g the server) gives a dict in memory that is checked before the files
+"""
+class BuildCache:
+	def __init__(self, directory: Path|str, memory: dict|None = None):
+		self.directory = Path(directory)
+		self.memory = memory
+		self.hits = 0
+		self.misses = 0
+
+	HASH_CHUNK = 1 << 20
+
+	@staticmethod
+	def key(source: bytes|mmap.mmap|memoryview, opt: int, inline: bool = True):
+		# The source is hashed a chunk at a time, so a mmap'd file is never copied into memory
+		digest = hashlib.sha256(f"{__version__}\0{CACHE_VERSION}\0{opt}\0{inline}\0".encode())
+		with memoryview(source) as view:
+			for start in range(0, len(view), BuildCache.HASH_CHUNK):
+				digest.update(view[start:start + BuildCache.HASH_CHUNK])
+		return digest.hexdigest()
+
+	@staticmethod
+	def file_key(filepath: Path|str, opt: int, inline: bool = True):
+		# The key of a file hashed through a read only mmap, like the lexer reads it (see Lexer.from_file)
+		with open(filepath, "rb") as file:
+			if os.fstat(file.fileno()).st_size == 0:
+				# An empty file can't be mapped
+				return BuildCache.key(b"", opt, inline)
+			with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+				return BuildCache.key(buffer, opt, inline)
+
+	def _entry(self, filepath: Path|str, opt: int):
+		name = hashlib.sha256(f"{os.path.abspath(filepath)}\0{opt}".encode()).hexdigest()
+		return self.directory / f"{name}.pickle"
+
+	def load(self, filepath: Path|str, opt: int, key: str):
+		# The CompiledFile of a source file, None when the file changed or was never compiled
+		entry = self._entry(filepath, opt)
+		compiled = self.memory.get(entry) if self.memory is not None else None
+		if compiled is None or compiled.key != key:
+			try:
+				with open(entry, "rb") as file:
+					compiled = pickle.load(file)
+			except (OSError, pickle.UnpicklingError, EOFError, AttributeError, TypeError):
+				compiled = None
+			if self.memory is not None and isinstance(compiled, CompiledFile):
+				self.memory[entry] = compiled
+		if not isinstance(compiled, CompiledFile) or compiled.key != key:
+			self.misses += 1
+			return None
+		self.hits += 1
+		return compiled
+
+	def save(self, filepath: Path|str, opt: int, compiled: CompiledFile):
+		# The entry is written to a temporary file first so an interrupted build never leaves half an entry
+		self.directory.mkdir(parents=True, exist_ok=True)
+		entry = self._entry(filepath, opt)
+		if self.memory is not None:
+			self.memory[entry] = compiled
+		temporary = entry.with_suffix(f".{os.getpid()}.tmp")
+		with open(temporary, "wb") as file:
+			pickle.dump(compiled, file, protocol=pickle.HIGHEST_PROTOCOL)
+		os.replace(temporary, entry)
@@ -0,0 +1,52 @@
+from __future__ import annotations
+import os
+import sys
+
+# The client side of the server (see server.RamenServer), it's kept apart so the CLI can
+# forward a command without importing the server or the compiler. socket and json are only
+# imported when a server is running, most of the time there's none and they are slow to import
+
+# Only these commands are sent to a running server, the others always run in the process that was started
+FORWARDED_COMMANDS = ["build", "run"]
+
+def default_socket_path():
+	# RAMEN_SOCKET chooses another socket, e.g for one server per project
+	if os.environ.get("RAMEN_SOCKET"):
+		return os.environ["RAMEN_SOCKET"]
+	# Unix sockets are only used where the temporary directory is TMPDIR or /tmp, tempfile is slow to import
+	user = os.getuid() if hasattr(os, "getuid") else os.getlogin()
+	return os.path.join(os.environ.get("TMPDIR") or "/tmp", f"ramen-{user}.sock")
+
+def request(message: dict, socketpath: str|None = None):
+	# Send one request to the server and return its response, None when no server is running
+	socketpath = socketpath or default_socket_path()
+	if not os.path.exists(socketpath):
+		return None
+	import json
+	import socket
+	if not hasattr(socket, "AF_UNIX"):
+		return None
+	try:
+		with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+			client.connect(str(socketpath))
+			client.sendall(json.dumps(message).encode() + b"\n")
+			client.shutdown(socket.SHUT_WR)
+			response = b"".join(iter(lambda: client.recv(65536), b""))
+	except (FileNotFoundError, ConnectionRefusedError):
+		return None
+	return json.loads(response) if response else None
+
+def forward(argv: list[str], socketpath: str|None = None):
+	"""
+	Run a command of the CLI in the server instead of this process. The output of the command
+	is written to the stdout and stderr of this process and its exit code is returned, or None
+	when the command isn't forwarded (no server is running or the command always runs locally)
+	"""
+	if not argv or argv[0] not in FORWARDED_COMMANDS:
+		return None
+	response = request({ "argv" : argv, "cwd" : os.getcwd() }, socketpath)
+	if response is None:
+		return None
+	sys.stdout.write(response["stdout"])
+	sys.stderr.write(response["stderr"])
+	return response["code"]
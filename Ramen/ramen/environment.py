@@ -1,50 +1,368 @@
-import glob
+from __future__ import annotations
 from pathlib import Path
 import os
+import sys
+import time
 
-from .lexer import Lexer
-from .token import TokenTypes
-from .ast import Parser
-from .bundler import Bundler
+# The compiler (the lexer, the parser, the optimizer...) is imported by the methods that use it,
+# so the commands that don't compile anything (e.g run or --help) start without loading it
+from .runner import NekoRunner, neko_directory
+
+def compile_source(filepath: str, key: str, opt: int = 0, inline: bool = True, pack: bool = True):
+	# Lex, parse, optimize and generate the code of one file. It's a module function so it can run in a worker process
+	# The file is lexed straight from a mmap (see Lexer.from_file), so the workers only get its path
+	# With pack the statements are also kept in a NodeStore, the builds that only write the code don't need them
+	# Returns the CompiledFile with the BuildStats of its phases
+	import io
+	from .lexer import Lexer
+	from .ast import Parser
+	from .arena import NodeStore
+	from .optimizer import optimize
+	from .cache import CompiledFile
+	from .stats import BuildStats
+	stats = BuildStats()
+	# The errors tell the file relative to the current directory, like the build prints it
+	with Lexer.from_file(os.path.relpath(filepath)) as lexer:
+		with stats.phase("lex"):
+			tokens = lexer.parse_stream()
+		stats.count("tokens", len(tokens))
+		# The tokens are sliced from the mapping, the file is parsed before it's unmapped
+		with stats.phase("parse"):
+			program = Parser(tokens, lexer.filename).parse_ast()
+	with stats.phase("optimize"):
+		program = optimize(program, opt, inline)
+	# The code is streamed one statement at a time like the output (see Program.emit)
+	with stats.phase("codegen"):
+		neko = io.StringIO()
+		program.emit(neko)
+	# The statements are packed into a store after the code is generated from the objects
+	store = None
+	if pack:
+		with stats.phase("pack"):
+			store = NodeStore()
+			for statement in program.body:
+				store.add(statement)
+	return CompiledFile(key, store, neko.getvalue()), stats
+
+# The environment of a worker process of build_projects, every worker makes it once with the runtime of the parent
+_worker_env = None
+
+def init_build_worker(ramen_home: Path, nbundler: Bundler, runtime: Runtime, neko_runtime: list|None):
+	global _worker_env
+	_worker_env = RamenEnv(ramen_home)
+	_worker_env._nbundler = nbundler
+	_worker_env._runtime = runtime
+	_worker_env._neko_runtime = neko_runtime
+
+def build_in_worker(projectpath: str, options: dict):
+	return _worker_env.build_isolated(projectpath, options)
 
 class RamenEnv:
 	FILE_EXT = "ramen"
 	NEKO_EXT = "bin"
+	MODULE_EXT = "n"
 
 	def __init__(self, ramen_home: Path|str):
 		ramen_home = Path(ramen_home)
-		self.nekovm = ramen_home / "neko_win64" / "neko"
-		self.nekoc = ramen_home / "neko_win64" / "nekoc"
+		self.ramen_home = ramen_home
 
-		dependencies = [
+		self.dependencies = [
 			ramen_home / "nekoramen" / "builtins.neko",
 		]
 
-		self.nbundler = Bundler() # The Neko Sources Bundler
-		self.nbundler.from_files(dependencies)
-		self.rbundler = Bundler() # Ramen Bundler
+		self._nbundler = None
+		self._runtime = None
+		self._neko_runtime = None
+		self._runner = None
+		self.compiled = None # The compiled files kept in memory between builds (see BuildCache), e.g by a server
+		self.hooks = None # The BuildHooks told about every build, from RAMEN_BUILD_HOOKS by default (see stats.load_hooks)
 
-	def build_project(self, projectpath: Path|str):
+	# Every file is compiled on its own and cached in the project (see BuildCache), rebuild ignores the cache
+	# With compact the whole program is kept in a NodeStore instead of AST objects when it's needed
+	# opt is the optimization level, see optimizer.PASSES, and inline replaces the calls of the thin builtins with
+	# the Neko primitive they call (see optimizer.INLINE_BUILTINS)
+	# jobs is the number of processes that compile the files, 0 for one per core
+	# With bytecode the NekoVM module (.n) is written directly instead of the Neko source, see bytecode.compile_module
+	# Returns the BuildStats of the build, the time of every phase and what it counted
+	def build_project(self, projectpath: Path|str, compact: bool = False, opt: int = 0, rebuild: bool = False, jobs: int = 1, inline: bool = True, bytecode: bool = False):
+		from .cache import BuildCache, CACHE_DIR
+		from .stats import BuildStats, load_hooks
+		from .optimizer import TREE_SHAKING_LEVEL
 		if not os.path.isdir(projectpath):
 			raise FileNotFoundError(projectpath)
+		if self.hooks is None:
+			self.hooks = load_hooks(os.environ.get("RAMEN_BUILD_HOOKS", ""))
+		stats = BuildStats(self.hooks)
+		start = time.perf_counter()
 		projectpath = Path(projectpath) 
-		psfs = self._search_ramen_from_path(Path.cwd() / projectpath) # Project Source Files
-		self.rbundler.from_files(psfs)
-		l = Lexer(self.rbundler.get_bundled())
-		p = Parser(l.parse_tokens())
-		program = p.parse_ast()
-		self.nbundler.from_source(program.as_neko())
-		self.nbundler.from_source("Main()")
-		
-		self.nbundler.save_to(projectpath.name+f".{self.NEKO_EXT}")
-
-	def run(self, projectname: str):
-		os.system(f"{self.nekoc} {projectname}.bin")
-		os.system(f"{self.nekovm} {projectname}.n")
-		os.system(f"del {projectname}.n")
+		with stats.phase("discover"):
+			psfs = self._search_ramen_from_path(Path.cwd() / projectpath) # Project Source Files
+		stats.count("files_scanned", len(psfs))
+		cache = BuildCache(projectpath / CACHE_DIR, self.compiled)
+		# The files are compiled while the output is written, see iter_units. The statements of the files are only
+		# needed to compile them to bytecode or to shake the whole program
+		units = self.iter_units(psfs, opt, cache, rebuild, jobs, stats, inline, bytecode or opt >= TREE_SHAKING_LEVEL)
+
+		if bytecode:
+			outputpath = projectpath.name+f".{self.MODULE_EXT}"
+			report = self.write_module(outputpath, units, opt, compact, stats)
+		else:
+			outputpath = projectpath.name+f".{self.NEKO_EXT}"
+			report = self.write_source(outputpath, units, opt, compact, stats)
+		stats.count("output_bytes", os.path.getsize(outputpath))
+		stats.add_time("total", time.perf_counter() - start)
+		# stdout is left to the output of the commands, e.g the JSON of --stats
+		if report is not None:
+			print(report, file=sys.stderr)
+		for hook in self.hooks:
+			hook.build(projectpath.name, stats)
+		return stats
+
+	def write_source(self, outputpath: str, units: Iterable[CompiledFile], opt: int, compact: bool, stats: BuildStats):
+		# The runtime and the program are streamed into the output in one pass, the code of every file is
+		# written as soon as the file is compiled. It's written to a temporary file first, so a file that doesn't
+		# compile never leaves half a program in place of the last output
+		# Returns the report of the tree shaker, None when it didn't run
+		from .optimizer import TREE_SHAKING_LEVEL
+		from .treeshaker import shake
+		report = None
+		temporary = f"{outputpath}.{os.getpid()}.tmp"
+		try:
+			with open(temporary, "w") as output:
+				if opt >= TREE_SHAKING_LEVEL:
+					with stats.phase("runtime"):
+						runtime = self.runtime
+					# The tree shaker needs the whole program, so the statements are joined again
+					program = self.join_units(units, compact)
+					with stats.phase("shake"):
+						program, runtime, report = shake(program, runtime)
+					stats.count("functions_removed", len(report.removed_functions))
+					stats.count("builtins_removed", len(report.removed_builtins))
+					with stats.phase("write"):
+						output.write(runtime)
+						program.emit(output)
+				else:
+					with stats.phase("runtime"):
+						nbundler = self.nbundler
+					with stats.phase("write"):
+						nbundler.write_to(output)
+					for unit in units:
+						with stats.phase("write"):
+							output.write(unit.neko)
+				output.write("\n\nMain()\n\n")
+			os.replace(temporary, outputpath)
+		finally:
+			if os.path.exists(temporary):
+				os.remove(temporary)
+		return report
+
+	def write_module(self, outputpath: str, units: Iterable[CompiledFile], opt: int, compact: bool, stats: BuildStats):
+		# The runtime and the statements of every file compiled to NekoVM bytecode, without nekoc
+		# Returns the report of the tree shaker, None when it didn't run
+		from .optimizer import TREE_SHAKING_LEVEL
+		from .treeshaker import shake
+		from .bytecode import compile_module, NekoParser
+		from .ast import Program
+		report = None
+		if opt >= TREE_SHAKING_LEVEL:
+			with stats.phase("runtime"):
+				runtime = self.runtime
+			program = self.join_units(units, compact)
+			with stats.phase("shake"):
+				program, runtime, report = shake(program, runtime)
+			stats.count("functions_removed", len(report.removed_functions))
+			stats.count("builtins_removed", len(report.removed_builtins))
+			# The shaken runtime depends on the program, so it's parsed for every build
+			runtimes = [NekoParser(runtime).parse()]
+			programs = [program.body if isinstance(program, Program) else program]
+		else:
+			with stats.phase("runtime"):
+				runtimes = self.neko_runtime
+			# A generator, every file is compiled to bytecode as soon as it's compiled and then released
+			programs = (unit.store for unit in units)
+		with stats.phase("bytecode"):
+			module = compile_module(runtimes, programs)
+		with stats.phase("write"):
+			with open(outputpath, "wb") as output:
+				output.write(module)
+		return report
+
+	# Build many projects, each one on its own (its files, its cache and its output) but with the same runtime,
+	# which is read and parsed once. The projects are split between jobs worker processes, 0 for one per core
+	# options are the options of build_project, the files of a project are compiled by its worker
+	# Returns (projectpath, BuildStats, error) for every project in the order of projectpaths, the stats are None
+	# when the build failed and error is None when it didn't
+	def build_projects(self, projectpaths: list[Path|str], jobs: int = 0, **options):
+		names = [Path(projectpath).name for projectpath in projectpaths]
+		duplicates = sorted({ name for name in names if names.count(name) > 1 })
+		if duplicates:
+			raise Exception(f"The outputs of the projects would overwrite each other, more than one project is named {', '.join(duplicates)}")
+		options = dict(options, jobs=1)
+		jobs = min(jobs or os.cpu_count() or 1, len(projectpaths))
+		if jobs <= 1:
+			results = [self.build_isolated(projectpath, options) for projectpath in projectpaths]
+		else:
+			from concurrent.futures import ProcessPoolExecutor
+			# Parsed before the workers start, they get them with the bundler
+			runtime = self.runtime
+			neko_runtime = self.neko_runtime if options.get("bytecode") else None
+			with ProcessPoolExecutor(max_workers=jobs, initializer=init_build_worker, initargs=(self.ramen_home, self.nbundler, runtime, neko_runtime)) as pool:
+				results = list(pool.map(build_in_worker, projectpaths, [options] * len(projectpaths)))
+		return [(projectpath, stats, error) for projectpath, (stats, error) in zip(projectpaths, results)]
+
+	def build_isolated(self, projectpath: Path|str, options: dict):
+		# A project that fails doesn't stop the others, its error is returned instead of its stats
+		try:
+			return self.build_project(projectpath, **options), None
+		except Exception as e:
+			return None, f"{type(e).__name__}: {e}"
+
+	# Build the project every time its files change, the compiled files are kept in memory between the builds
+	# so only the files that changed are compiled again. With run the program is run after every build
+	def watch_project(self, projectpath: Path|str, compact: bool = False, opt: int = 0, jobs: int = 1, run: bool = False, poll: bool = False, debounce: float = 0.1, inline: bool = True, bytecode: bool = False):
+		if not os.path.isdir(projectpath):
+			raise FileNotFoundError(projectpath)
+		from .watcher import create_watcher, changes
+		projectpath = Path(projectpath)
+		if self.compiled is None:
+			self.compiled = {}
+		watcher = create_watcher(projectpath, poll)
+		print(f"Watching {projectpath} with {type(watcher).__name__}")
+		try:
+			changed = []
+			while True:
+				start = time.perf_counter()
+				try:
+					self.build_project(projectpath, compact=compact, opt=opt, jobs=jobs, inline=inline, bytecode=bytecode)
+				except Exception as e:
+					print(f"Build failed: {e}")
+				else:
+					names = ", ".join(sorted(os.path.relpath(path, projectpath) for path in changed))
+					print(f"Built {projectpath.name} in {time.perf_counter() - start:.3f}s" + (f" ({names} changed)" if names else ""))
+					if run:
+						self.run(projectpath.name)
+						print()
+				changed = changes(watcher, debounce)
+		finally:
+			watcher.close()
+
+	@property
+	def nbundler(self):
+		# The Neko Sources Bundler, the dependencies are only read by the first build
+		# It's only kept once every dependency is read, so a build that failed to read them (e.g in a server)
+		# doesn't leave an empty bundler to the next builds. The runtimes are kept the same way
+		if self._nbundler is None:
+			from .bundler import Bundler
+			nbundler = Bundler()
+			nbundler.from_files(self.dependencies)
+			self._nbundler = nbundler
+		return self._nbundler
+
+	@property
+	def runtime(self):
+		if self._runtime is None:
+			from .runtime import Runtime
+			self._runtime = Runtime(self.nbundler.get_bundled())
+		return self._runtime
+
+	@property
+	def neko_runtime(self):
+		# The Neko code of every file of the runtime parsed for the bytecode compiler (see bytecode.compile_module),
+		# it's parsed by the first build that writes a module and shared by the next ones
+		if self._neko_runtime is None:
+			from .bytecode import NekoParser
+			self._neko_runtime = [NekoParser(source).parse() for source in self.nbundler.sources]
+		return self._neko_runtime
+
+	def iter_units(self, filepaths: list[str], opt: int = 0, cache: BuildCache|None = None, rebuild: bool = False, jobs: int = 1, stats: BuildStats|None = None, inline: bool = True, pack: bool = True):
+		# Compile every file on its own, or take it from the cache when it didn't change. The files that have
+		# to be compiled are split between jobs worker processes, they are lexed from a mmap and never read
+		# into memory by this process. The units are yielded in the order of filepaths as soon as they are
+		# ready and the generator doesn't keep them, so the caller can write and release them one at a time
+		# With pack every unit has its statements in a NodeStore (see compile_source), a cached unit without them
+		# is compiled again
+		from .cache import BuildCache
+		from .stats import BuildStats
+		stats = stats if stats is not None else BuildStats()
+		cached = {} # index: CompiledFile
+		pending = [] # (index, key)
+		for i, filepath in enumerate(filepaths):
+			with stats.phase("read"):
+				key = BuildCache.file_key(filepath, opt, inline)
+			stats.count("bytes_read", os.path.getsize(filepath))
+			unit = None
+			if cache is not None and not rebuild:
+				with stats.phase("cache"):
+					unit = cache.load(filepath, opt, key)
+			if unit is not None and (unit.store is not None or not pack):
+				cached[i] = unit
+			else:
+				pending.append((i, key))
+		stats.count("files_cached", len(cached))
+		stats.count("files_compiled", len(pending))
+
+		jobs = jobs or os.cpu_count() or 1
+		arguments = ([filepaths[i] for i, _ in pending], [key for _, key in pending], [opt] * len(pending), [inline] * len(pending), [pack] * len(pending))
+		pool = None
+		if jobs > 1 and len(pending) > 1:
+			from concurrent.futures import ProcessPoolExecutor
+			pool = ProcessPoolExecutor(max_workers=min(jobs, len(pending)))
+			# Small chunks keep the workers busy when the files have very different sizes
+			chunksize = max(1, len(pending) // (jobs * 4))
+			compiled = pool.map(compile_source, *arguments, chunksize=chunksize)
+		else:
+			# Lazy, every file is compiled when its unit is needed
+			compiled = map(compile_source, *arguments)
+
+		try:
+			for i, filepath in enumerate(filepaths):
+				unit = cached.pop(i, None)
+				if unit is None:
+					with stats.phase("compile"):
+						unit, unit_stats = next(compiled)
+					stats.merge(unit_stats)
+					if cache is not None:
+						with stats.phase("cache"):
+							cache.save(filepath, opt, unit)
+				if unit.store is not None:
+					unit.store.count_kinds(stats)
+				yield unit
+				del unit
+		finally:
+			if pool is not None:
+				pool.shutdown(cancel_futures=True)
+
+	def join_units(self, units: list[CompiledFile], compact: bool = False):
+		# The statements of every compiled file in one program, or in one store with compact
+		from .ast import Program
+		from .arena import NodeStore
+		if compact:
+			store = NodeStore()
+			for unit in units:
+				for statement in unit.store:
+					store.add(statement)
+			return store
+		return Program([statement for unit in units for statement in unit.store])
+
+	@property
+	def runner(self):
+		# Only running a program needs the NekoVM of the platform, building doesn't
+		if self._runner is None:
+			self._runner = NekoRunner(neko_directory(self.ramen_home))
+		return self._runner
+
+	# Returns the RunReport of the run, with the exit code of the program and the time of every phase
+	# The module written by a build with bytecode is run when it's newer than the Neko source
+	def run(self, projectname: str, args: list[str]|None = None):
+		source, module = Path(f"{projectname}.{self.NEKO_EXT}"), Path(f"{projectname}.{self.MODULE_EXT}")
+		if module.exists() and (not source.exists() or module.stat().st_mtime >= source.stat().st_mtime):
+			return self.runner.run(module, args)
+		return self.runner.run(source, args)
 
 
 	def _search_ramen_from_path(self, path: Path|str):
 		# This method will search every ramen file in a project recursively
+		# The files are sorted so every build joins them in the same order
+		import glob
 		path = Path(path)
-		return glob.glob(str(path / f"**/*.{self.FILE_EXT}"), recursive=True)
+		return sorted(glob.glob(str(path / f"**/*.{self.FILE_EXT}"), recursive=True))
@@ -1,4 +1,70 @@
-from .token import Token, TokenTypes
+import mmap
+import os
+import re
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from .token import Token, TokenTypes, TokenStream
+
+# Single and double character tokens
+SYMBOLS = {
+	"," : TokenTypes.TOK_COMMA,
+	"$" : TokenTypes.TOK_DOLLAR,
+	"." : TokenTypes.TOK_DOT,
+	".." : TokenTypes.TOK_DOTDOT,
+	"+" : TokenTypes.TOK_PLUS,
+	"-" : TokenTypes.TOK_MINUS,
+	"/" : TokenTypes.TOK_SLASH,
+	"*" : TokenTypes.TOK_ASTERISK,
+	"(" : TokenTypes.TOK_LPAREN,
+	")" : TokenTypes.TOK_RPAREN,
+	"{" : TokenTypes.TOK_LBRACE,
+	"}" : TokenTypes.TOK_RBRACE,
+	"[" : TokenTypes.TOK_LBRACKET,
+	"]" : TokenTypes.TOK_RBRACKET,
+	";" : TokenTypes.TOK_SEMICOLON,
+	"=" : TokenTypes.TOK_ASSIGN,
+	"==" : TokenTypes.TOK_EQ,
+	"!" : TokenTypes.TOK_BANG,
+	"!=" : TokenTypes.TOK_NEQ,
+	">" : TokenTypes.TOK_GT,
+	">=" : TokenTypes.TOK_GTE,
+	"<" : TokenTypes.TOK_LT,
+	"<=" : TokenTypes.TOK_LTE,
+}
+
+# Every token is matched by one pattern, the group that matched tells what kind of token it is.
+# Whitespaces and comments before the token are skipped by the same match, when they are followed
+# by the end of the source no group matches (instead of backtracking into them).
+KEYWORD, SYMBOL, NUMBER, STRING, INVALID = range(1, 6)
+TOKEN_PATTERN = r"""
+	(?:[ \t\r\n\v\f]+|\#[^\n]*)*
+	(?:
+		([^\W\d_][^\W_]*)
+		|(\.\.|[=!<>]=?|[,$.+\-/*(){}\[\];])
+		|(\d+(?:\.(?!\.)\d*)*)
+		|("[^"]*")
+		|(.)
+		|\Z
+	)
+"""
+TOKEN_REGEX = re.compile(TOKEN_PATTERN, re.VERBOSE | re.DOTALL)
+
+# The same tables for lexing bytes (a mmap'd file or a memoryview) directly.
+# Every byte of an UTF-8 encoded character outside ASCII is treated as a letter
+BYTES_SYMBOLS = { symbol.encode() : type for symbol, type in SYMBOLS.items() }
+BYTES_TOKEN_PATTERN = rb"""
+	(?:[ \t\r\n\v\f]+|\#[^\n]*)*
+	(?:
+		([a-zA-Z\x80-\xff][a-zA-Z0-9\x80-\xff]*)
+		|(\.\.|[=!<>]=?|[,$.+\-/*(){}\[\];])
+		|([0-9]+(?:\.(?!\.)[0-9]*)*)
+		|("[^"]*")
+		|(.)
+		|\Z
+	)
+"""
+BYTES_TOKEN_REGEX = re.compile(BYTES_TOKEN_PATTERN, re.VERBOSE | re.DOTALL)
 
 class Lexer:
 
@@ -19,11 +85,15 @@ class Lexer:
 		"return" : TokenTypes.TOK_RETURN,
 		"debugbreak" : TokenTypes.TOK_EOF
 	}
+	bytes_keywords_map = { keyword.encode() : type for keyword, type in keywords_map.items() }
 
-	def __init__(self, source_code: str):
+	# source_code can also be bytes, a mmap or a memoryview, they can only be lexed with scan
+	# and they are not copied to append the debugbreak, the end of the buffer ends the tokens
+	def __init__(self, source_code: str|bytes|mmap.mmap|memoryview):
 		self.current = 0
 		self.next = 0
-		self.source_code = source_code + "\ndebugbreak;"
+		self.source_code = source_code + "\ndebugbreak;" if isinstance(source_code, str) else source_code
+		self.filename = "<source>" # The name of the file in the errors, see from_file
 		self._cchar = None
 		self._nchar = None
 		self.next_char()
@@ -77,6 +147,9 @@ class Lexer:
 		writer = ""
 		has_dot = False
 		while self.is_digit(self.cchar) or self.cchar == ".":
+			# The dots of a range (0..n) are not part of the number
+			if self.cchar == "." and self.nchar == ".":
+				break
 			if self.cchar == "." and has_dot:
 				return None
 			writer += self.cchar
@@ -106,6 +179,9 @@ class Lexer:
 		token = Token(TokenTypes.TOK_COMMA, ",") if self.cchar == "," else token
 		token = Token(TokenTypes.TOK_DOLLAR, "$") if self.cchar == "$" else token
 		token = Token(TokenTypes.TOK_DOT, ".") if self.cchar == "." else token
+		if self.cchar == "." and self.nchar == ".":
+			token = Token(TokenTypes.TOK_DOTDOT, "..")
+			self.next_char()
 		token = Token(TokenTypes.TOK_PLUS, "+") if self.cchar == "+" else token
 		token = Token(TokenTypes.TOK_MINUS, "-") if self.cchar == "-" else token
 		token = Token(TokenTypes.TOK_SLASH, "/") if self.cchar == "/" else token
@@ -179,12 +255,168 @@ class Lexer:
 		self.next_char()
 		return token
 
+	def scan(self, position: int = 0):
+		"""
+		Yield (type, start, end) for every token from position until the end of the source.
+		Instead of testing every kind of token one after another, a single match of
+		TOKEN_REGEX skips the whitespaces and the kind of token is looked up from the
+		group that matched. start and end are the bounds of the whole lexeme, for strings
+		that includes both of the quotes.
+		"""
+		source = self.source_code
+		if isinstance(source, str):
+			keywords, symbols, match, dot = self.keywords_map, SYMBOLS, TOKEN_REGEX.match, "."
+		else:
+			keywords, symbols, match, dot = self.bytes_keywords_map, BYTES_SYMBOLS, BYTES_TOKEN_REGEX.match, b"."
+		# Slices of a memoryview are memoryviews which can't be used as a dict key
+		view = isinstance(source, memoryview)
+
+		while True:
+			token = match(source, position)
+			group = token.lastindex
+			if group is None:
+				return
+			start, position = token.span(group)
+			if group == STRING:
+				yield TokenTypes.TOK_STRING, start, position
+				continue
+			lexeme = source[start:position]
+			if view:
+				lexeme = lexeme.tobytes()
+
+			if group == KEYWORD:
+				type = keywords.get(lexeme, TokenTypes.TOK_IDENTIFIER)
+				if type == TokenTypes.TOK_EOF:
+					return
+				yield type, start, position
+			elif group == SYMBOL:
+				yield symbols[lexeme], start, position
+			elif group == NUMBER:
+				dots = lexeme.count(dot)
+				yield TokenTypes.TOK_INT if dots == 0 else TokenTypes.TOK_FLOAT if dots == 1 else TokenTypes.TOK_INVALID, start, position
+			else:
+				yield TokenTypes.TOK_INVALID, start, position
+
+	def iter_tokens(self):
+		source = self.source_code
+		decode = not isinstance(source, str)
+		for type, start, end in self.scan(self.current):
+			if type == TokenTypes.TOK_INVALID:
+				self.error("Invalid Token Found", start)
+			literal = source[start + 1:end - 1] if type == TokenTypes.TOK_STRING else source[start:end]
+			yield Token(type, str(literal, "utf-8") if decode else literal)
+
+	def error(self, message: str, offset: int):
+		# The line and the column of the offset come from the line index of the source (see TokenStream.location)
+		line, column = TokenStream(self.source_code).location(offset)
+		raise Exception(f"{self.filename}:{line}:{column}: {message}")
+
 	def parse_tokens(self):
-		tokens = []
-		token = self.next_token()
-		while token.type != TokenTypes.TOK_EOF:
-			if token.type == TokenTypes.TOK_INVALID:
-				raise Exception("Invalid Token Found")
-			tokens.append(token)
-			token = self.next_token()
-		return tokens
\ No newline at end of file
+		return list(self.iter_tokens())
+
+	# With strict=False the invalid tokens are kept in the stream instead of raising an error,
+	# an editor needs the tokens of a source that is still being typed
+	def parse_stream(self, strict: bool = True):
+		stream = TokenStream(self.source_code)
+		types, starts, ends = stream.types.append, stream.starts.append, stream.ends.append
+		for type, start, end in self.scan(self.current):
+			if type == TokenTypes.TOK_INVALID and strict:
+				self.error("Invalid Token Found", start)
+			types(type)
+			starts(start)
+			ends(end)
+		return stream
+
+	def relex(self, stream: TokenStream, offset: int, deleted: int, inserted: str):
+		"""
+		Apply an edit to the source and return the new token stream without lexing the whole source again.
+		The tokens before the edit are kept as they are. Lexing restarts at the start of the line of the edit,
+		a number looks one character past its end for a second dot so it can change with the text behind it,
+		but not with the next line. A quote that has no closing quote is an invalid token and becomes a string
+		once another quote is typed, even lines later, so lexing restarts there when the last quote before the
+		line is one. Lexing stops as soon as a new token starts at the same place as an old token behind the
+		edit, from there the source is the same so the rest of the old tokens are kept and only shifted.
+		The invalid tokens are kept in the stream like parse_stream(strict=False).
+		e.g:
+		lexer = Lexer(source)
+		stream = lexer.parse_stream(strict=False)
+		stream = lexer.relex(stream, 10, 0, "x") # insert "x" at offset 10
+		"""
+		source = stream.source
+		self.source_code = source[:offset] + inserted + source[offset + deleted:]
+		delta = len(inserted) - deleted
+		edit_end = offset + len(inserted)
+
+		text = isinstance(source, str)
+		keep = stream.count_before(offset)
+		line = source.rfind("\n" if text else b"\n", 0, offset) + 1
+		keep = min(keep, bisect_left(range(keep), line, key=stream.start))
+		# Only the last quote of the source can be left without its closing quote
+		quote = source.rfind('"' if text else b'"', 0, line)
+		if quote >= 0:
+			index = bisect_left(range(keep), quote, key=stream.start)
+			if index < keep and stream.start(index) == quote and stream.types[index] == TokenTypes.TOK_INVALID:
+				keep = index
+		restart = stream.end(keep - 1) if keep else 0
+		result = TokenStream(self.source_code)
+		result.types = stream.types[:keep]
+		result.starts = stream.starts[:keep]
+		result.ends = stream.ends[:keep]
+		resync = len(stream)
+
+		for type, start, end in self.scan(restart):
+			if start >= edit_end:
+				old = bisect_left(range(keep, len(stream)), start - delta, key=stream.start) + keep
+				if old < len(stream) and stream.start(old) == start - delta:
+					resync = old
+					break
+			result.append(type, start, end)
+
+		relexed = len(result)
+		result.types.extend(stream.types[resync:])
+		result.starts.extend(stream.starts[resync:])
+		result.ends.extend(stream.ends[resync:])
+
+		# The new tokens have their real offsets, the ones behind them are shifted by the edit
+		shifts = []
+		def add_shift(index: int, delta: int):
+			if shifts and shifts[-1][0] == index:
+				shifts.pop()
+			if (shifts[-1][1] if shifts else 0) != delta:
+				shifts.append((index, delta))
+		for index, old_delta in stream.shifts:
+			if index < keep:
+				add_shift(index, old_delta)
+		add_shift(keep, 0)
+		if resync < len(stream):
+			add_shift(relexed, stream.shift(resync) + delta)
+			for index, old_delta in stream.shifts:
+				if index > resync:
+					add_shift(index - resync + relexed, old_delta + delta)
+		result.shifts = shifts
+		if len(shifts) > result.MAX_SHIFTS:
+			result.normalize()
+		return result
+
+	@classmethod
+	@contextmanager
+	def from_file(cls, filepath: str):
+		"""
+		Lex a file through a read only mmap so the file is never copied into a string.
+		The literals of the tokens are sliced from the mapping, so the tokens (and the stream)
+		can only be used inside the with block
+		e.g:
+		with Lexer.from_file("main.ramen") as lexer:
+			program = Parser(lexer.parse_stream()).parse_ast()
+		"""
+		with open(filepath, "rb") as file:
+			if os.fstat(file.fileno()).st_size == 0:
+				# An empty file can't be mapped
+				lexer = cls(b"")
+				lexer.filename = str(filepath)
+				yield lexer
+				return
+			with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+				lexer = cls(buffer)
+				lexer.filename = str(filepath)
+				yield lexer
\ No newline at end of file
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+from .ast import (AST, Program, Value, Identifier, Operation, FunctionCall, FunctionDefinition, LambdaFunction, VariableDeclaration,
+	VariableInitialization, ValueDefinition, BlockStatement, ReturnStatemnt, RepeatStatement, RepeatRangeStatement, RepeatEachStatement,
+	BreakStatement, ContinueStatement, fields, walk)
+from .arena import NodeStore
+from .token import Token, TokenTypes
+
+# Neko integers are 32 bits, folding stays far from the edges so the literal is always read back the same
+INT_MIN = -(1 << 30)
+INT_MAX = (1 << 30) - 1
+
+NUMBERS = [ TokenTypes.TOK_INT, TokenTypes.TOK_FLOAT ]
+
+def number(value: Value):
+	return int(value.value) if value.type == TokenTypes.TOK_INT else float(value.value)
+
+def number_value(result: int|float):
+	if isinstance(result, int):
+		if not INT_MIN <= result <= INT_MAX:
+			return None
+		return Value(Token(TokenTypes.TOK_INT, str(result)))
+	literal = repr(result)
+	# Neko can't read exponents, inf or nan
+	if "e" in literal or "n" in literal:
+		return None
+	return Value(Token(TokenTypes.TOK_FLOAT, literal))
+
+def bool_value(result: bool):
+	return Value(Token(TokenTypes.TOK_TRUE, "true") if result else Token(TokenTypes.TOK_FALSE, "false"))
+
+COMPARISONS = {
+	"==" : lambda a, b: a == b,
+	"!=" : lambda a, b: a != b,
+	">" : lambda a, b: a > b,
+	">=" : lambda a, b: a >= b,
+	"<" : lambda a, b: a < b,
+	"<=" : lambda a, b: a <= b,
+}
+
+def fold_operation(operation: Operation):
+	# Returns the Value of an operation on two literals the way NekoVM computes it,
+	# or None when the operation is left for the run time
+	left, right, op = operation.left, operation.right, operation.op
+	if not isinstance(left, Value) or not isinstance(right, Value):
+		return None
+
+	if left.type in NUMBERS and right.type in NUMBERS:
+		a, b = number(left), number(right)
+		if op == "+":
+			return number_value(a + b)
+		if op == "-":
+			return number_value(a - b)
+		if op == "*":
+			return number_value(a * b)
+		if op == "/":
+			# The division of two integers is a float in Neko
+			return number_value(float(a) / b) if b != 0 else None
+		if op in COMPARISONS:
+			return bool_value(COMPARISONS[op](a, b))
+		return None
+
+	if op == "+" and TokenTypes.TOK_STRING in (left.type, right.type):
+		# Integers are converted to their decimal string, the float formatting of Neko is not reproduced
+		if not all(value.type in [ TokenTypes.TOK_STRING, TokenTypes.TOK_INT ] for value in (left, right)):
+			return None
+		# The integer is converted like Neko does, e.g 007 is "7"
+		a, b = (str(int(value.value)) if value.type == TokenTypes.TOK_INT else value.value for value in (left, right))
+		# A string that ends with a backslash would escape the first character of the next one
+		if a.endswith("\\"):
+			return None
+		return Value(Token(TokenTypes.TOK_STRING, a + b))
+
+	if op in ["==", "!="] and left.type == right.type and left.type in [ TokenTypes.TOK_STRING, TokenTypes.TOK_BOOL ]:
+		return bool_value(COMPARISONS[op](left.value, right.value))
+
+	return None
+
+def fold_constants(node: AST):
+	"""
+	Replace every Operation whose operands are literals with the Value it computes,
+	e.g 60 * 60 * 24 becomes 86400 and "prefix" + "suffix" becomes "prefixsuffix".
+	The children are folded before their parents so a whole tree of literals becomes one Value.
+	Returns the folded node (which is a new Value when node itself is folded)
+	"""
+	# walk gives the parents before their children, reversed it's the children first
+	for current in reversed(list(walk(node))):
+		for name in fields(type(current)):
+			value = getattr(current, name)
+			if isinstance(value, Operation):
+				folded = fold_operation(value)
+				if folded is not None:
+					setattr(current, name, folded)
+			elif isinstance(value, list):
+				for i, item in enumerate(value):
+					if isinstance(item, Operation):
+						folded = fold_operation(item)
+						if folded is not None:
+							value[i] = folded
+	if isinstance(node, Operation):
+		return fold_operation(node) or node
+	return node
+
+# The builtins that only forward their arguments to a Neko primitive (see builtins.neko): the name
+# of the builtin to its number of arguments, the primitive and the literals added after the arguments
+INLINE_BUILTINS = {
+	"echo" : (1, "$print", []),
+	"echoln" : (1, "$print", [ Token(TokenTypes.TOK_STRING, "\\n") ]),
+	"arrlen" : (1, "$asize", []),
+}
+
+def inline_builtins(node: AST):
+	"""
+	Replace the calls of the builtins of INLINE_BUILTINS with a call of the primitive they forward to,
+	e.g echoln(x) becomes $print(x, "\\n"), so a call in a loop doesn't pay for the function of the builtin.
+	A builtin that is declared again in node (as a function, a parameter or a variable) isn't inlined,
+	the functions of the other files are not seen so they need the inlining to be turned off.
+	Returns node, the calls are changed in place
+	"""
+	declared = set()
+	calls = []
+	for current in walk(node):
+		if isinstance(current, FunctionCall):
+			calls.append(current)
+		elif isinstance(current, FunctionDefinition):
+			declared.add(current.identifier.name)
+			declared.update(param.name for param in current.params)
+		elif isinstance(current, LambdaFunction):
+			declared.update(param.name for param in current.params)
+		elif isinstance(current, VariableDeclaration):
+			declared.add(current.identifier.name)
+	for call in calls:
+		name = call.identifier.name if isinstance(call.identifier, Identifier) else None
+		if name not in INLINE_BUILTINS or name in declared:
+			continue
+		arity, primitive, extra = INLINE_BUILTINS[name]
+		# Only a single call with all its arguments, not e.g echo(x)(y)
+		if len(call.arguments) != 1 or len(call.arguments[0].arguments) != arity:
+			continue
+		call.identifier = Identifier(Token(TokenTypes.TOK_IDENTIFIER, primitive))
+		call.arguments[0].arguments.extend(Value(token) for token in extra)
+	return node
+
+# The nodes whose returns, breaks and continues don't belong to the function around them
+LOOPS = (RepeatStatement, RepeatRangeStatement, RepeatEachStatement)
+FUNCTIONS = (FunctionDefinition, LambdaFunction)
+# The variables that keep the new arguments while the parameters are set, they can't be written in Ramen
+TAIL_ARGUMENT = "__arg{}"
+
+def identifier(name: str):
+	return Identifier(Token(TokenTypes.TOK_IDENTIFIER, name))
+
+def tail_calls(function: FunctionDefinition):
+	"""
+	The returns of function that call function itself with all its parameters, as (parent, field, index, return)
+	where index is None when the return is the field itself. The returns in a loop of the body are skipped (a
+	continue would go to that loop) and so are the ones in a nested function. Returns None when the calls can't be
+	replaced: the body declares a parameter or the function again, or it sets the function
+	"""
+	name = function.identifier.name
+	names = { param.name for param in function.params } | { name }
+	for current in walk(function.body):
+		if isinstance(current, (VariableDeclaration, RepeatRangeStatement, RepeatEachStatement)) and current.identifier.name in names:
+			return None
+		if isinstance(current, ValueDefinition) and isinstance(current.left, Identifier) and current.left.name == name:
+			return None
+	found = []
+	stack = [function.body]
+	while stack:
+		node = stack.pop()
+		for field in fields(type(node)):
+			value = getattr(node, field)
+			for index, child in (enumerate(value) if isinstance(value, list) else [(None, value)]):
+				if isinstance(child, ReturnStatemnt) and is_self_call(child.value, name, len(function.params)):
+					found.append((node, field, index, child))
+				elif isinstance(child, AST) and not isinstance(child, LOOPS + FUNCTIONS):
+					stack.append(child)
+	return found
+
+def is_self_call(value: AST, name: str, count: int):
+	return (
+		isinstance(value, FunctionCall) and isinstance(value.identifier, Identifier) and value.identifier.name == name
+		and len(value.arguments) == 1 and len(value.arguments[0].arguments) == count
+	)
+
+def jump_back(function: FunctionDefinition, call: FunctionCall):
+	# The statements that set the parameters to the arguments of call and go back to the start of the body.
+	# Every argument is evaluated before any parameter is set, an argument that is its own parameter is skipped
+	pairs = [(param.name, argument) for param, argument in zip(function.params, call.arguments[0].arguments)
+		if not (isinstance(argument, Identifier) and argument.name == param.name)]
+	statements = []
+	if len(pairs) == 1:
+		statements.append(ValueDefinition(identifier(pairs[0][0]), pairs[0][1]))
+	else:
+		for i, (_, argument) in enumerate(pairs):
+			statements.append(VariableInitialization(ValueDefinition(identifier(TAIL_ARGUMENT.format(i)), argument)))
+		for i, (param, _) in enumerate(pairs):
+			statements.append(ValueDefinition(identifier(param), identifier(TAIL_ARGUMENT.format(i))))
+	statements.append(ContinueStatement())
+	return BlockStatement(statements)
+
+def eliminate_tail_calls(node: AST):
+	"""
+	Replace the returns of a function that call the function itself, e.g return Sum(n - 1, acc + n), with setting
+	its parameters and going back to the start of its body. The body is put in a repeat that a break ends,
+	so the function still returns what the end of its body gives. A deep recursion becomes a loop that
+	doesn't grow the stack of the NekoVM and doesn't pay for a call at every step.
+	Returns node, the functions are changed in place
+	"""
+	for function in [current for current in walk(node) if isinstance(current, FunctionDefinition)]:
+		found = tail_calls(function)
+		if not found:
+			continue
+		for parent, field, index, statement in found:
+			replacement = jump_back(function, statement.value)
+			if index is None:
+				setattr(parent, field, replacement)
+			else:
+				getattr(parent, field)[index] = replacement
+		function.body = BlockStatement([RepeatStatement(BlockStatement(function.body.body + [BreakStatement()]))])
+	return node
+
+# The passes of every optimization level, a level also runs the passes of the levels below it
+PASSES = [
+	[], # 0: no optimization
+	[ fold_constants, eliminate_tail_calls ], # 1
+	[], # 2: tree shaking, it's run on the whole program with the runtime (see treeshaker.shake)
+]
+TREE_SHAKING_LEVEL = 2
+
+# The builtins are inlined at every level unless inline is False
+def optimize(program: Program|NodeStore, level: int, inline: bool = True):
+	passes = [p for passes in PASSES[:level + 1] for p in passes]
+	if inline:
+		passes.insert(0, inline_builtins)
+	if not passes:
+		return program
+	if isinstance(program, NodeStore):
+		# The statements of a store are rebuilt, optimized and packed into a new store one at a time
+		store = NodeStore()
+		for statement in program:
+			for p in passes:
+				statement = p(statement)
+			store.add(statement)
+		return store
+	for p in passes:
+		program = p(program)
+	return program
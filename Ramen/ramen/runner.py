@@ -0,0 +1,112 @@
+from __future__ import annotations
+import hashlib
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# The NekoVM binaries of every platform, in the dependencies of Ramen
+NEKO_PLATFORMS = {
+	"Linux" : "neko_linux64",
+	"Windows" : "neko_win64",
+	"Darwin" : "neko_osx64",
+}
+
+# The variable that tells the dynamic loader of each platform where to find libneko
+LIBRARY_PATHS = {
+	"Linux" : "LD_LIBRARY_PATH",
+	"Darwin" : "DYLD_LIBRARY_PATH",
+	"Windows" : "PATH",
+}
+
+def neko_directory(ramen_home: Path|str, system: str|None = None):
+	system = system or platform.system()
+	if system not in NEKO_PLATFORMS:
+		raise Exception(f"Could not found a NekoVM for your Platform ({system})")
+	return Path(ramen_home) / NEKO_PLATFORMS[system]
+
+class RunReport:
+	def __init__(self):
+		self.phases = {} # The name of a phase to its wall time in seconds
+		self.cached = False # True when nekoc was skipped
+		self.returncode = 0
+
+	def __str__(self):
+		phases = ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in self.phases.items())
+		return f"{phases}{' (cached bytecode)' if self.cached else ''}"
+
+"""
+NekoRunner compiles Neko sources (the .bin files made by a build) with nekoc and runs them with the
+NekoVM, the modules (.n files) that a build wrote itself are run without nekoc. The programs are called directly without a shell, and the compiled bytecode is kept in a cache
+directory under the SHA-256 of the source, so nekoc only runs when the source changed since the last run
+"""
+class NekoRunner:
+	CACHE_DIR = Path(".ramencache") / "bytecode"
+
+	def __init__(self, nekodir: Path|str, system: str|None = None):
+		system = system or platform.system()
+		self.nekodir = Path(nekodir)
+		self.nekovm = self.nekodir / "neko"
+		self.nekoc = self.nekodir / "nekoc"
+		# With capture the output of the programs is written to sys.stdout and sys.stderr after they exit
+		# instead of going straight to the terminal, e.g when they are redirected by a server
+		self.capture = False
+
+		# The VM finds its libraries (std.ndll, ...) in NEKOPATH and libneko with the dynamic loader
+		self.environ = dict(os.environ)
+		self.environ["NEKOPATH"] = str(self.nekodir)
+		variable = LIBRARY_PATHS.get(system, "LD_LIBRARY_PATH")
+		paths = [str(self.nekodir)] + ([self.environ[variable]] if self.environ.get(variable) else [])
+		self.environ[variable] = os.pathsep.join(paths)
+
+	def _call(self, command: list[str]):
+		if not self.capture:
+			return subprocess.run(command, env=self.environ)
+		completed = subprocess.run(command, env=self.environ, capture_output=True, text=True)
+		sys.stdout.write(completed.stdout)
+		sys.stderr.write(completed.stderr)
+		return completed
+
+	def compile(self, sourcepath: Path|str, report: RunReport|None = None):
+		# The path of the bytecode of a Neko source, nekoc is only called when it isn't in the cache
+		report = report or RunReport()
+		sourcepath = Path(sourcepath)
+		start = time.perf_counter()
+		with open(sourcepath, "rb") as file:
+			digest = hashlib.sha256(file.read()).hexdigest()
+		cachedir = sourcepath.parent / self.CACHE_DIR
+		bytecode = cachedir / f"{sourcepath.stem}-{digest[:32]}.n"
+		report.phases["hash"] = time.perf_counter() - start
+		if bytecode.exists():
+			report.cached = True
+			return bytecode
+
+		start = time.perf_counter()
+		# nekoc writes the bytecode next to the source, it's moved to the cache after
+		# so the errors of the program still name the source file
+		completed = self._call([str(self.nekoc), str(sourcepath)])
+		report.phases["nekoc"] = time.perf_counter() - start
+		if completed.returncode != 0:
+			raise Exception(f"nekoc failed to compile {sourcepath} ({completed.returncode})")
+		cachedir.mkdir(parents=True, exist_ok=True)
+		# The bytecode of the older versions of the source
+		for stale in cachedir.glob(f"{sourcepath.stem}-{'?' * 32}.n"):
+			stale.unlink()
+		os.replace(sourcepath.with_suffix(".n"), bytecode)
+		return bytecode
+
+	def run(self, sourcepath: Path|str, args: list[str]|None = None):
+		# Compile (when needed) and run a Neko source, or run a module (.n) as it is
+		# Returns the RunReport with the time of every phase
+		report = RunReport()
+		if Path(sourcepath).suffix == ".n":
+			bytecode = sourcepath
+		else:
+			bytecode = self.compile(sourcepath, report)
+		start = time.perf_counter()
+		completed = self._call([str(self.nekovm), str(bytecode)] + list(args or []))
+		report.phases["neko"] = time.perf_counter() - start
+		report.returncode = completed.returncode
+		return report
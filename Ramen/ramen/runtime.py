@@ -0,0 +1,70 @@
+from __future__ import annotations
+import re
+
+# The tokens of Neko code that matter to find the top level definitions and what they use
+NEKO_TOKENS = re.compile(r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\])*"|[{}()\[\]]|\$?[A-Za-z_]\w*', re.DOTALL)
+DEFINITION = re.compile(r"\s*=\s*function\b")
+OPENING = "{(["
+CLOSING = "})]"
+
+"""
+Runtime is the Neko code that is prepended to every program (e.g builtins.neko) split into its top level
+definitions, e.g "echo = function(value) { ... }". The text before a definition (comments, blank lines)
+belongs to that definition and the text after the last definition is kept on its own.
+For every definition it knows the identifiers used in its body, so the builtins that a program needs
+can be found without emitting the rest
+"""
+class Runtime:
+	def __init__(self, source: str):
+		self.source = source
+		self.chunks = [] # (name, text), name is None for the text after the last definition
+		self.references = {} # name to the identifiers used in the definition
+		self._split()
+
+	def _split(self):
+		source = self.source
+		depth = 0
+		start = 0 # Where the current chunk starts
+		name = None
+		used = set()
+		for token in NEKO_TOKENS.finditer(source):
+			text = token.group()
+			if text in OPENING:
+				depth += 1
+			elif text in CLOSING:
+				depth -= 1
+				if depth == 0 and name is not None and text == "}":
+					self._add(name, source[start:token.end()], used)
+					start, name, used = token.end(), None, set()
+			elif text[0] in "/\"$":
+				continue
+			elif depth == 0 and name is None and DEFINITION.match(source, token.end()):
+				name = text
+			elif name is not None:
+				used.add(text)
+		if start < len(source):
+			self.chunks.append((None, source[start:]))
+
+	def _add(self, name: str, text: str, used: set):
+		self.chunks.append((name, text))
+		self.references.setdefault(name, set()).update(used - { name })
+
+	@property
+	def names(self):
+		return [name for name, _ in self.chunks if name is not None]
+
+	def needed(self, used: set[str]):
+		# The definitions used by a program, with the definitions that they use
+		needed = set()
+		pending = [name for name in used if name in self.references]
+		while pending:
+			name = pending.pop()
+			if name in needed:
+				continue
+			needed.add(name)
+			pending.extend(n for n in self.references[name] if n in self.references)
+		return needed
+
+	def render(self, keep: set[str]|None = None):
+		# The Neko code of the runtime with only the definitions in keep (all of them when keep is None)
+		return "".join(text for name, text in self.chunks if keep is None or name is None or name in keep)
@@ -0,0 +1,73 @@
+from __future__ import annotations
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
+from pathlib import Path
+
+from .client import request
+
+class RequestHandler(socketserver.StreamRequestHandler):
+	def handle(self):
+		message = json.loads(self.rfile.readline())
+		if message.get("ping") or message.get("shutdown"):
+			response = { "stdout" : "", "stderr" : "", "code" : 0 }
+			self.server.running = not message.get("shutdown")
+		else:
+			response = self.server.execute(message["argv"], message["cwd"])
+		self.wfile.write(json.dumps(response).encode())
+
+"""
+RamenServer keeps one process (and everything it loaded: the environment, the runtime and
+the compiled files) alive between the invocations of the CLI. It accepts one JSON request per
+connection on a Unix domain socket: {"argv": [...], "cwd": "..."} runs a command in the directory
+of the client and the response is {"stdout": "...", "stderr": "...", "code": 0}. {"shutdown": true}
+stops the server and {"ping": true} only answers. The requests are handled one at a time because
+a command runs in the working directory of its client, e.g:
+server = RamenServer(path, lambda argv: c4py.run(RamenCLI, argv))
+server.serve()
+"""
+class RamenServer(getattr(socketserver, "UnixStreamServer", object)):
+	def __init__(self, socketpath: Path|str, command):
+		if not hasattr(socket, "AF_UNIX"):
+			raise Exception("The server needs Unix domain sockets which aren't supported on this platform")
+		self.socketpath = Path(socketpath)
+		self.command = command # Called with the argv of a request, its return value is ignored
+		self.running = False
+		if self.socketpath.exists():
+			if request({ "ping" : True }, self.socketpath) is not None:
+				raise Exception(f"A server is already running on {self.socketpath}")
+			# The socket of a server that didn't stop cleanly
+			self.socketpath.unlink()
+		super().__init__(str(self.socketpath), RequestHandler)
+
+	def execute(self, argv: list[str], cwd: str):
+		stdout, stderr = io.StringIO(), io.StringIO()
+		code = 0
+		previous = os.getcwd()
+		try:
+			os.chdir(cwd)
+			with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+				self.command(argv)
+		except SystemExit as e:
+			code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+			if not isinstance(e.code, (int, type(None))):
+				stderr.write(f"{e.code}\n")
+		except Exception as e:
+			stderr.write(f"{type(e).__name__}: {e}\n")
+			code = 1
+		finally:
+			os.chdir(previous)
+		return { "stdout" : stdout.getvalue(), "stderr" : stderr.getvalue(), "code" : code }
+
+	def serve(self):
+		self.running = True
+		try:
+			while self.running:
+				self.handle_request()
+		finally:
+			self.server_close()
+			with contextlib.suppress(FileNotFoundError):
+				self.socketpath.unlink()
@@ -0,0 +1,88 @@
+from __future__ import annotations
+import json
+import time
+from contextlib import contextmanager
+
+"""
+BuildStats collects what a build did: the time spent in every phase (in seconds) and counters
+(files, bytes, tokens, nodes by type...). The phases that run in worker processes are measured
+in the workers and added together, so with more than one job they can add up to more than the wall
+time of the build, e.g:
+stats = BuildStats()
+with stats.phase("lex"):
+	tokens = lexer.parse_stream()
+stats.count("tokens", len(tokens))
+"""
+class BuildStats:
+	def __init__(self, hooks: list[BuildHook]|None = None):
+		self.hooks = hooks or [] # Told about every phase as soon as it's added
+		self.phases = {}
+		self.counters = {}
+		self.nodes = {} # The number of nodes of every type in the compiled program
+
+	@contextmanager
+	def phase(self, name: str):
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.add_time(name, time.perf_counter() - start)
+
+	def add_time(self, name: str, seconds: float):
+		self.phases[name] = self.phases.get(name, 0.0) + seconds
+		for hook in self.hooks:
+			hook.phase(name, seconds)
+
+	def count(self, name: str, amount: int = 1):
+		self.counters[name] = self.counters.get(name, 0) + amount
+
+	def count_node(self, name: str, amount: int = 1):
+		self.nodes[name] = self.nodes.get(name, 0) + amount
+
+	def merge(self, other: BuildStats):
+		for name, seconds in other.phases.items():
+			self.add_time(name, seconds)
+		for name, amount in other.counters.items():
+			self.count(name, amount)
+		for name, amount in other.nodes.items():
+			self.count_node(name, amount)
+
+	def as_dict(self):
+		return { "phases" : dict(self.phases), "counters" : dict(self.counters), "nodes" : dict(sorted(self.nodes.items())) }
+
+	def to_json(self, indent: int|None = 2):
+		return json.dumps(self.as_dict(), indent=indent)
+
+	def __getstate__(self):
+		# The stats of a worker process are sent back without the hooks
+		return { "phases" : self.phases, "counters" : self.counters, "nodes" : self.nodes }
+
+	def __setstate__(self, state: dict):
+		self.hooks = []
+		self.__dict__.update(state)
+
+"""
+BuildHook is the interface of the objects that receive the stats of the builds, e.g to send them to
+a metrics collector. A hook overrides the methods it needs: phase is called at the end of every phase
+(the phases of the workers when their results come back) and build at the end of the build with all its stats
+"""
+class BuildHook:
+	def phase(self, name: str, seconds: float):
+		pass
+
+	def build(self, project: str, stats: BuildStats):
+		pass
+
+def load_hooks(spec: str):
+	"""
+	Create the hooks of a comma separated list of "module:name", where name is a BuildHook class
+	or any callable that returns a hook, e.g RAMEN_BUILD_HOOKS="ci.metrics:StatsdHook"
+	"""
+	import importlib
+	hooks = []
+	for item in filter(None, (item.strip() for item in spec.split(","))):
+		module, _, name = item.partition(":")
+		if not name:
+			raise Exception(f"Invalid build hook {item!r}, expecting module:name")
+		hooks.append(getattr(importlib.import_module(module), name)())
+	return hooks
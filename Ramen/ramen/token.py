@@ -1,6 +1,12 @@
 from __future__ import annotations
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
 
 class Token:
+	__slots__ = ("type", "literal")
+
 	def __init__(self, type: TokenTypes, literal: str):
 		self.type = type
 		self.literal = literal
@@ -8,6 +14,127 @@ class Token:
 	def __str__(self):
 		return f"{TokenTypes.where_value(self.type)}\t\t:\t{self.literal}"
 
+"""
+TokenStream keeps the tokens of a source in parallel arrays of types, start offsets and end offsets
+instead of one Token object per token. The literal of a token is only sliced from the source when it's asked for
+e.g:
+stream = Lexer(source).parse_stream()
+stream.literal(0)
+stream[0].type
+
+After an incremental edit (see Lexer.relex) the offsets of the tokens behind the edit are not rewritten
+one by one. Instead shifts keeps a sorted list of (first index, delta) and the delta of the last shift
+that starts at or before a token is added to its stored offsets, so use start() and end() to read them.
+"""
+class TokenStream:
+	MAX_SHIFTS = 32
+
+	# source can also be bytes, a mmap or a memoryview, the literals are decoded as UTF-8
+	def __init__(self, source: str|bytes|memoryview):
+		self.source = source
+		self.types = array("i")
+		self.starts = array("i")
+		self.ends = array("i")
+		self.shifts = []
+		self._line_starts = None
+		self._view = None
+
+	def append(self, type: int, start: int, end: int):
+		self.types.append(type)
+		self.starts.append(start)
+		self.ends.append(end)
+
+	def __len__(self):
+		return len(self.types)
+
+	def __getitem__(self, index: int):
+		# The parser asks for the same token many times in a row
+		view = self._view
+		if view is None or view.index != index:
+			if index < 0:
+				index += len(self.types)
+			if not 0 <= index < len(self.types):
+				raise IndexError("token index out of range")
+			view = self._view = TokenView(self, index)
+		return view
+
+	def __iter__(self):
+		for i in range(len(self.types)):
+			yield TokenView(self, i)
+
+	def type(self, index: int):
+		return self.types[index]
+
+	def shift(self, index: int):
+		if not self.shifts:
+			return 0
+		i = bisect_right(self.shifts, index, key=itemgetter(0))
+		return self.shifts[i - 1][1] if i else 0
+
+	def start(self, index: int):
+		return self.starts[index] + self.shift(index)
+
+	def end(self, index: int):
+		return self.ends[index] + self.shift(index)
+
+	def count_before(self, offset: int):
+		# The number of tokens that end before offset
+		return bisect_left(range(len(self.types)), offset, key=self.end)
+
+	def normalize(self):
+		# Apply the pending shifts to the stored offsets
+		for i, (index, delta) in enumerate(self.shifts):
+			end = self.shifts[i + 1][0] if i + 1 < len(self.shifts) else len(self.types)
+			for j in range(index, end):
+				self.starts[j] += delta
+				self.ends[j] += delta
+		self.shifts = []
+
+	def literal(self, index: int):
+		start, end = self.start(index), self.end(index)
+		if self.types[index] == TokenTypes.TOK_STRING:
+			start, end = start + 1, end - 1 # without the quotes
+		literal = self.source[start:end]
+		return literal if isinstance(literal, str) else str(literal, "utf-8")
+
+	@property
+	def line_starts(self):
+		if self._line_starts is None:
+			newline = re.compile("\n" if isinstance(self.source, str) else b"\n")
+			line_starts = array("i", [0])
+			line_starts.extend(match.end() for match in newline.finditer(self.source))
+			self._line_starts = line_starts
+		return self._line_starts
+
+	def location(self, offset: int):
+		# Returns the line and column (both start from 1) of an offset in the source
+		line = bisect_right(self.line_starts, offset)
+		return line, offset - self.line_starts[line - 1] + 1
+
+	def position(self, index: int):
+		return self.location(self.start(index))
+
+	def to_tokens(self):
+		return [Token(self.types[i], self.literal(i)) for i in range(len(self.types))]
+
+class TokenView:
+	__slots__ = ("stream", "index")
+
+	def __init__(self, stream: TokenStream, index: int):
+		self.stream = stream
+		self.index = index
+
+	@property
+	def type(self):
+		return self.stream.types[self.index]
+
+	@property
+	def literal(self):
+		return self.stream.literal(self.index)
+
+	def __str__(self):
+		return f"{TokenTypes.where_value(self.type)}\t\t:\t{self.literal}"
+
 class Enum:
 	def __init__(self, items: list[str]):
 		self.__items = items
@@ -32,6 +159,7 @@ TokenTypes = Enum([
 		"TOK_RBRACKET", # ]
 
 		"TOK_DOT",
+		"TOK_DOTDOT", # ..
 		"TOK_COMMA",
 		"TOK_SEMICOLON",
 
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from .ast import AST, Program, FunctionDefinition, Identifier, Indexing, walk
+from .arena import NodeStore
+from .runtime import Runtime
+
+ENTRY_POINT = "Main"
+
+class ShakeReport:
+	def __init__(self):
+		self.functions = 0
+		self.removed_functions = []
+		self.removed_functions_bytes = 0
+		self.builtins = 0
+		self.removed_builtins = []
+		self.removed_builtins_bytes = 0
+
+	def __str__(self):
+		return (
+			f"Tree shaking removed {len(self.removed_functions)}/{self.functions} functions "
+			f"({self.removed_functions_bytes} bytes) and {len(self.removed_builtins)}/{self.builtins} builtins "
+			f"({self.removed_builtins_bytes} bytes)"
+		)
+
+def used_names(node: AST):
+	# The names in the program and the runtime functions that its generated code calls
+	names = set()
+	for n in walk(node):
+		if isinstance(n, Identifier):
+			names.add(n.name)
+		elif isinstance(n, Indexing):
+			names.update(n.runtime_names())
+	return names
+
+def shake(program: Program|NodeStore, runtime: Runtime):
+	"""
+	Remove the top level functions and the runtime definitions that can't be reached from Main.
+	The statements that are not function definitions always run so they are reachable too, and
+	a function is reachable when its name is used by a reachable statement. A local variable
+	with the same name as a function keeps the function, the analysis never removes too much.
+	Returns the shaken program, the Neko code of the runtime that is still needed and a ShakeReport
+	"""
+	report = ShakeReport()
+	functions = {} # name to the index of the statements that define it
+	uses = []
+	pending = [ENTRY_POINT]
+	for i, statement in enumerate(program.body if isinstance(program, Program) else program):
+		uses.append(used_names(statement))
+		if isinstance(statement, FunctionDefinition):
+			functions.setdefault(statement.identifier.name, []).append(i)
+			report.functions += 1
+		else:
+			pending.extend(uses[i])
+
+	reachable = set()
+	used = set()
+	while pending:
+		name = pending.pop()
+		if name in used:
+			continue
+		used.add(name)
+		for i in functions.get(name, []):
+			reachable.add(i)
+			pending.extend(uses[i])
+
+	def kept(i: int, statement: AST):
+		if not isinstance(statement, FunctionDefinition) or i in reachable:
+			return True
+		report.removed_functions.append(statement.identifier.name)
+		report.removed_functions_bytes += len(statement.as_neko())
+		return False
+
+	if isinstance(program, NodeStore):
+		shaken = NodeStore()
+		for i, statement in enumerate(program):
+			if kept(i, statement):
+				shaken.add(statement)
+	else:
+		shaken = Program([statement for i, statement in enumerate(program.body) if kept(i, statement)])
+
+	needed = runtime.needed(used)
+	for name, text in runtime.chunks:
+		if name is not None:
+			report.builtins += 1
+			if name not in needed:
+				report.removed_builtins.append(name)
+				report.removed_builtins_bytes += len(text)
+	return shaken, runtime.render(needed), report
@@ -0,0 +1,2 @@
+# The version of the compiler, keep it the same as CURRENT_VERSION in install.py
+__version__ = "1.1.0"
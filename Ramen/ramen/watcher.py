@@ -0,0 +1,156 @@
+from __future__ import annotations
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+from .cache import CACHE_DIR
+
+FILE_EXT = ".ramen"
+
+# The inotify flags, see inotify(7)
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT = struct.Struct("iIII") # wd, mask, cookie, len followed by the name
+
+def watched_directories(root: Path):
+	# The directories of a project, without the build cache because every build writes in it
+	for directory, subdirectories, _ in os.walk(root):
+		subdirectories[:] = [d for d in subdirectories if d != CACHE_DIR]
+		yield Path(directory)
+
+"""
+InotifyWatcher waits for the changes of the source files of a project with the inotify API of Linux
+(through ctypes, there's no module to install). Inotify doesn't watch a tree, so every directory has
+its own watch and the directories that are created later are watched when they appear
+"""
+class InotifyWatcher:
+	def __init__(self, root: Path|str):
+		self.root = Path(root)
+		self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+		self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+		if self.fd < 0:
+			raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+		self.directories = {} # watch descriptor to its directory
+		for directory in watched_directories(self.root):
+			self._add(directory)
+
+	@classmethod
+	def available(cls):
+		return sys.platform.startswith("linux") and ctypes.util.find_library("c") is not None
+
+	def _add(self, directory: Path):
+		wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+		if wd >= 0:
+			self.directories[wd] = directory
+
+	def wait(self, timeout: float|None = None):
+		# The source files that changed, an empty set when nothing changed before the timeout
+		readable, _, _ = select.select([self.fd], [], [], timeout)
+		if not readable:
+			return set()
+		data = os.read(self.fd, 64 * 1024)
+		changed = set()
+		offset = 0
+		while offset < len(data):
+			wd, mask, _, length = EVENT.unpack_from(data, offset)
+			name = data[offset + EVENT.size:offset + EVENT.size + length].rstrip(b"\0")
+			offset += EVENT.size + length
+			if mask & IN_Q_OVERFLOW:
+				# Some events were lost, every file is considered changed
+				changed.update(self.root.rglob(f"*{FILE_EXT}"))
+				continue
+			directory = self.directories.get(wd)
+			if directory is None:
+				continue
+			if mask & IN_IGNORED:
+				del self.directories[wd]
+				continue
+			path = directory / os.fsdecode(name)
+			if mask & IN_ISDIR:
+				if mask & (IN_CREATE | IN_MOVED_TO) and path.name != CACHE_DIR:
+					for subdirectory in watched_directories(path):
+						self._add(subdirectory)
+						changed.update(subdirectory.glob(f"*{FILE_EXT}"))
+				continue
+			if path.suffix == FILE_EXT:
+				changed.add(path)
+		return changed
+
+	def close(self):
+		os.close(self.fd)
+
+"""
+PollingWatcher finds the changes of the source files by comparing the modification time and
+the size of every file at an interval, it works everywhere
+"""
+class PollingWatcher:
+	def __init__(self, root: Path|str, interval: float = 0.5):
+		self.root = Path(root)
+		self.interval = interval
+		self.snapshot = self._snapshot()
+
+	def _snapshot(self):
+		snapshot = {}
+		for directory in watched_directories(self.root):
+			for path in directory.glob(f"*{FILE_EXT}"):
+				try:
+					stat = path.stat()
+				except FileNotFoundError:
+					continue
+				snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+		return snapshot
+
+	def wait(self, timeout: float|None = None):
+		deadline = None if timeout is None else time.monotonic() + timeout
+		while True:
+			snapshot = self._snapshot()
+			changed = { path for path in snapshot.keys() | self.snapshot.keys() if snapshot.get(path) != self.snapshot.get(path) }
+			self.snapshot = snapshot
+			if changed:
+				return changed
+			if deadline is not None and time.monotonic() >= deadline:
+				return set()
+			time.sleep(self.interval if deadline is None else max(0, min(self.interval, deadline - time.monotonic())))
+
+	def close(self):
+		pass
+
+def create_watcher(root: Path|str, poll: bool = False):
+	# inotify when it's available, polling otherwise or with poll
+	if not poll and InotifyWatcher.available():
+		try:
+			return InotifyWatcher(root)
+		except (OSError, AttributeError):
+			pass
+	return PollingWatcher(root)
+
+def changes(watcher: InotifyWatcher|PollingWatcher, debounce: float = 0.1):
+	"""
+	Wait for the next changes of the source files. The events that come in quick succession
+	(e.g an editor that writes a temporary file then renames it) are returned together, the
+	changes are only returned when no file changed for debounce seconds
+	"""
+	changed = set()
+	while not changed:
+		# The events of the other files (e.g the build cache) give no changes
+		changed = watcher.wait()
+	while True:
+		more = watcher.wait(debounce)
+		if not more:
+			return changed
+		changed |= more
@@ -1,4 +1,4 @@
-import inspect
+import sys
 from abc import ABCMeta
 from argparse import ArgumentParser
 
@@ -11,6 +11,14 @@ def eliminate_none_items(d: dict):
 		res[key] = value
 	return res
 
+# The annotations can also be strings with "from __future__ import annotations"
+ANNOTATION_TYPES = {
+	"bool" : bool,
+	"int" : int,
+	"float" : float,
+	"list[str]" : list,
+}
+
 # ---\ 
 
 
@@ -66,7 +74,13 @@ class Program(metaclass=ProgramMeta):
 		return getattr(self._config, __k)
 
 
-def get_parser(program):
+def parameters_of(callback):
+	# The parameters of a command, inspect is only imported when a command is used because it's slow to import
+	import inspect
+	return inspect.signature(callback).parameters.values(), inspect.Parameter.empty
+
+# With argv only the arguments of the command that is in argv are added, the others are only listed
+def get_parser(program, argv: list[str]|None = None):
 	kwargs = {
 		"description" : program["description"]
 	}
@@ -81,12 +95,14 @@ def get_parser(program):
 		}
 		kwargs = eliminate_none_items(kwargs)
 		command_parser = subparsers.add_parser(command.name, **kwargs)
+		if argv is not None and command.name not in argv:
+			continue
 		
 		# Getting the configuration and adding it to the command parser
 		used_shorthands = []
-		parameters = inspect.signature(command.callback).parameters
+		parameters, empty = parameters_of(command.callback)
 
-		for i, parameter in enumerate(parameters.values()):
+		for i, parameter in enumerate(parameters):
 			# Just skip the first parameter because it's usually self
 			if i == 0:
 				continue
@@ -96,32 +112,45 @@ def get_parser(program):
 
 
 			# Checking if the arguments is optional or required
-			if parameter.default != inspect._empty:
+			if parameter.default != empty:
 				configs["metavar"] = ""
 				names[0] = "--" + parameter.name
-				shorthand = names[0][0]
+				shorthand = "-" + parameter.name[0]
 				if shorthand not in used_shorthands:
-					names.append("-" + parameter.name[0])
+					names.append(shorthand)
+					used_shorthands.append(shorthand)
 				configs["default"] = parameter.default
 
 				# Checking if the parameter has help
 				if command.help and parameter.name in command.help:
 					configs["help"] = command.help[parameter.name]
 
-			# ToDo: Add the type conversion feature by checking the annotations and add it to the configs
+			# Converting the argument with the annotation of the parameter, a bool is a flag
+			annotation = ANNOTATION_TYPES.get(parameter.annotation, parameter.annotation)
+			if annotation == bool:
+				configs.pop("metavar", None)
+				configs["action"] = "store_true"
+			elif annotation in [int, float]:
+				configs["type"] = annotation
+			# A list takes every argument that is left, e.g the projects of build-all
+			elif annotation == list or getattr(annotation, "__origin__", None) is list:
+				configs["nargs"] = "+"
 			command_parser.add_argument(*names, **configs)
 	return parser
 
-def run(prog_class: ProgramMeta):
+# argv is the list of arguments to parse, sys.argv[1:] when it's None
+def run(prog_class: ProgramMeta, argv: list[str]|None = None):
+	argv = sys.argv[1:] if argv is None else argv
 	prog = prog_class()
-	parser = get_parser(prog)
-	args = parser.parse_args()
+	parser = get_parser(prog, argv)
+	args = parser.parse_args(argv)
 	if not args.command_name:
 		return
-	command = getattr(prog, args.command_name)
+	# The name of a command has dashes instead of the underscores of its method, e.g build-all
+	command = next(c for c in prog["commands"] if c.name == args.command_name)
 	
 	kw = {}
-	for i, parameter in enumerate(inspect.signature(command.callback).parameters.values()):
+	for i, parameter in enumerate(parameters_of(command.callback)[0]):
 		if hasattr(args, parameter.name):
 			kw[parameter.name] = getattr(args, parameter.name)
 	command(prog, **kw)
@@ -0,0 +1,31 @@
+# Measure with tracemalloc the memory of a parsed program kept as AST objects
+# and kept in a NodeStore
+# Usage: python bench/bench_ast_memory.py [copies]
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "Ramen"))
+
+from ramen import Lexer, Parser, NodeStore
+
+def measure(name: str, parse, stream):
+	tracemalloc.start()
+	start = time.perf_counter()
+	program = parse(stream)
+	elapsed = time.perf_counter() - start
+	current, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	print(f"{name:<10} {current / 1024:>10.0f} KiB kept {peak / 1024:>10.0f} KiB peak {elapsed:>8.3f}s")
+	return program
+
+if __name__ == "__main__":
+	copies = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+	sample = (ROOT / "examples" / "fulltest.ramen").read_text()
+	source = "\n".join([sample] * copies)
+	stream = Lexer(source).parse_stream()
+	print(f"Parsing {len(stream)} tokens")
+	measure("objects", lambda stream: Parser(stream).parse_ast(), stream)
+	measure("nodestore", lambda stream: Parser(stream).parse_ast(NodeStore()), stream)
@@ -0,0 +1,48 @@
+# Build a generated project of many files three times: without a cache, with every file cached
+# and after one file changed. Only the changed file is compiled again on the last build
+# Usage: python bench/bench_build_cache.py [files]
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "Ramen"))
+
+from ramen import RamenEnv
+
+def source(index: int, functions: int = 20):
+	writer = []
+	for i in range(functions):
+		writer.append(f"fun F{index}n{i}(var a, var b)\n{{\n\tvar x = a * {i} + b - 60 * 60;\n\tif (x > {i}) {{\n\t\treturn x;\n\t}}\n\treturn F{index}n{i}(x, b);\n}}\n")
+	if index == 0:
+		writer.append("fun Main()\n{\n\techoln(F0n0(1, 2));\n}\n")
+	return "\n".join(writer)
+
+def build(env: RamenEnv, project: Path):
+	start = time.perf_counter()
+	env.build_project(project.name, opt=1)
+	return time.perf_counter() - start
+
+if __name__ == "__main__":
+	files = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+	env = RamenEnv(ROOT / "dependencies")
+	directory = Path(tempfile.mkdtemp())
+	cwd = os.getcwd()
+	try:
+		os.chdir(directory)
+		project = directory / "project"
+		project.mkdir()
+		for i in range(files):
+			(project / f"file{i}.ramen").write_text(source(i))
+		cold = build(env, project)
+		warm = build(env, project)
+		with open(project / "file1.ramen", "a") as file:
+			file.write("\nfun Changed()\n{\n\treturn 1;\n}\n")
+		changed = build(env, project)
+		print(f"{files} files cold {cold:.3f}s cached {warm:.3f}s one file changed {changed:.3f}s")
+	finally:
+		os.chdir(cwd)
+		shutil.rmtree(directory)
@@ -0,0 +1,50 @@
+# Compare the throughput of the character by character lexer (Lexer.next_token)
+# with the table driven one (Lexer.iter_tokens), and the memory used by a list of
+# Token objects with the one used by a TokenStream
+# Usage: python bench/bench_lexer.py [copies]
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "Ramen"))
+
+from ramen import Lexer, TokenTypes
+
+def legacy_tokens(source: str):
+	lexer = Lexer(source)
+	tokens = []
+	token = lexer.next_token()
+	while token.type != TokenTypes.TOK_EOF:
+		tokens.append(token)
+		token = lexer.next_token()
+	return tokens
+
+def table_tokens(source: str):
+	return list(Lexer(source).iter_tokens())
+
+def measure(name: str, lex, source: str):
+	start = time.perf_counter()
+	tokens = lex(source)
+	elapsed = time.perf_counter() - start
+	print(f"{name:<12} {len(tokens):>10} tokens {elapsed:>8.3f}s {len(tokens) / elapsed:>12.0f} tokens/s")
+	return elapsed
+
+def measure_memory(name: str, lex, source: str):
+	tracemalloc.start()
+	tokens = lex(source)
+	current, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	print(f"{name:<12} {len(tokens):>10} tokens {current / 1024:>10.0f} KiB kept {peak / 1024:>10.0f} KiB peak")
+
+if __name__ == "__main__":
+	copies = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+	sample = (ROOT / "examples" / "fulltest.ramen").read_text()
+	source = "\n".join([sample] * copies)
+	print(f"Lexing {len(source)} characters ({source.count(chr(10)) + 1} lines)")
+	legacy = measure("next_token", legacy_tokens, source)
+	table = measure("iter_tokens", table_tokens, source)
+	print(f"Speedup: {legacy / table:.1f}x")
+	measure_memory("tokens", lambda source: Lexer(source).parse_tokens(), source)
+	measure_memory("stream", lambda source: Lexer(source).parse_stream(), source)
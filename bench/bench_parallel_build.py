@@ -0,0 +1,38 @@
+# Build a generated project from scratch with 1 worker and with more workers
+# Usage: python bench/bench_parallel_build.py [files] [jobs]
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "Ramen"))
+sys.path.insert(0, str(ROOT / "bench"))
+
+from ramen import RamenEnv
+from bench_build_cache import source
+
+if __name__ == "__main__":
+	files = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+	jobs = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+	env = RamenEnv(ROOT / "dependencies")
+	directory = Path(tempfile.mkdtemp())
+	cwd = os.getcwd()
+	try:
+		os.chdir(directory)
+		project = directory / "project"
+		project.mkdir()
+		for i in range(files):
+			(project / f"file{i}.ramen").write_text(source(i))
+		outputs = []
+		for j in sorted({1, jobs}):
+			start = time.perf_counter()
+			env.build_project(project.name, opt=1, rebuild=True, jobs=j)
+			print(f"{files} files {j:>3} jobs {time.perf_counter() - start:.3f}s")
+			outputs.append(Path(f"{project.name}.{env.NEKO_EXT}").read_text())
+		print("same output" if len(set(outputs)) == 1 else "different output")
+	finally:
+		os.chdir(cwd)
+		shutil.rmtree(directory)
@@ -0,0 +1,30 @@
+# Parse a single expression with many terms, e.g var x = a * 0 + b - c * 2 ...
+# Before the precedence climbing parser every operator recursed into Parser.walk
+# so expressions with more than a few hundred terms hit the recursion limit
+# Usage: python bench/bench_parser.py [terms]
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "Ramen"))
+
+from ramen import Lexer, Parser
+
+def expression(terms: int):
+	operators = ["+", "-", "*", "/", "+", "-"]
+	writer = ["var x = a0"]
+	for i in range(1, terms):
+		writer.append(f"{operators[i % len(operators)]} a{i}")
+	return " ".join(writer) + ";"
+
+if __name__ == "__main__":
+	for terms in [int(sys.argv[1])] if len(sys.argv) > 1 else [1000, 10000, 100000]:
+		stream = Lexer(expression(terms)).parse_stream()
+		start = time.perf_counter()
+		program = Parser(stream).parse_ast()
+		parsed = time.perf_counter() - start
+		start = time.perf_counter()
+		output = program.as_neko()
+		generated = time.perf_counter() - start
+		print(f"{terms:>8} terms {len(stream):>8} tokens parse {parsed:>8.3f}s ({len(stream) / parsed:>9.0f} tokens/s) as_neko {generated:>8.3f}s")
@@ -0,0 +1,72 @@
+# Compare lexing a whole buffer again with Lexer.relex after a one character edit. Before that, the streams of
+# random edits of random sources are checked against a full lex of the edited source
+# Usage: python bench/bench_relex.py [copies] [trials]
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "Ramen"))
+
+from ramen import Lexer
+
+# Pieces of the random sources, with the text that changes a token behind it: quotes, dots after numbers and comments
+PIECES = ['"', ".", "..", "1", "12", "1.5", " ", "\n", "x", "ab", "in", "#", "(", ")", "=", "<", "!", "@"]
+
+def tokens(stream):
+	return [(stream.type(i), stream.start(i), stream.end(i)) for i in range(len(stream))]
+
+def check(trials: int, seed: int = 0):
+	# Returns the number of edits that relex got wrong, every trial makes 3 edits in a row on the same stream
+	rng = random.Random(seed)
+	cases = [('echoln("hi', [(10, 0, '"')])] # An unterminated string that an edit closes
+	for _ in range(trials):
+		source = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 30)))
+		edits = []
+		length = len(source)
+		for _ in range(3):
+			offset = rng.randint(0, length)
+			deleted = rng.randint(0, min(3, length - offset))
+			inserted = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 2)))
+			edits.append((offset, deleted, inserted))
+			length += len(inserted) - deleted
+		cases.append((source, edits))
+	failures = 0
+	for source, edits in cases:
+		lexer = Lexer(source)
+		stream = lexer.parse_stream(strict=False)
+		for offset, deleted, inserted in edits:
+			stream = lexer.relex(stream, offset, deleted, inserted)
+			source = source[:offset] + inserted + source[offset + deleted:]
+			if tokens(stream) != tokens(Lexer(source).parse_stream(strict=False)):
+				print(f"relex differs from a full lex after the edit {(offset, deleted, inserted)!r} of {source!r}")
+				failures += 1
+				break
+	return failures
+
+def measure(callback, repeat: int):
+	start = time.perf_counter()
+	for _ in range(repeat):
+		result = callback()
+	return (time.perf_counter() - start) / repeat, result
+
+if __name__ == "__main__":
+	copies = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+	trials = int(sys.argv[2]) if len(sys.argv) > 2 else 3000
+	failures = check(trials)
+	print(f"Random edits: {failures} of {trials + 1} differ from a full lex")
+	if failures:
+		sys.exit(1)
+	sample = (ROOT / "examples" / "fulltest.ramen").read_text()
+	source = "\n".join([sample] * copies)
+	lexer = Lexer(source)
+	stream = lexer.parse_stream(strict=False)
+	middle = source.index("result = 1", len(source) // 2)
+	print(f"Buffer: {len(source)} characters, {len(stream)} tokens")
+
+	full, _ = measure(lambda: Lexer(source).parse_stream(strict=False), 3)
+	relex, _ = measure(lambda: lexer.relex(stream, middle + 9, 1, "2"), 100)
+	print(f"parse_stream {full * 1000:>10.2f} ms")
+	print(f"relex        {relex * 1000:>10.2f} ms")
+	print(f"Speedup: {full / relex:.0f}x")
@@ -0,0 +1,108 @@
+# Compile the programs of bench/runtime and run them many times in the NekoVM, to measure how fast the
+# generated code runs (not how fast it compiles). Every program is a project with a main.ramen, its output
+# is checked against expected.txt before it's timed. The results can be saved and compared like bench/suite.py
+# Usage: python bench/bench_runtime.py [--runs 10] [--opt 0] [--neko DIR] [--threshold 0.2] [--noinline] [--bytecode] [--save FILE] [--compare FILE] [programs...]
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "Ramen"))
+
+from ramen import RamenEnv
+from ramen.runner import NekoRunner, neko_directory
+
+PROGRAMS = ROOT / "bench" / "runtime"
+
+def percentile(times: list[float], p: int):
+	if len(times) == 1:
+		return times[0]
+	return statistics.quantiles(times, n=100, method="inclusive")[p - 1]
+
+def build(env: RamenEnv, program: Path, directory: Path, opt: int, inline: bool, bytecode: bool):
+	# The project is built in directory, the cache of the build too so the repository stays clean
+	project = directory / program.name
+	shutil.copytree(program, project, ignore=shutil.ignore_patterns(".ramencache"))
+	cwd = os.getcwd()
+	try:
+		os.chdir(directory)
+		env.build_project(project.name, opt=opt, rebuild=True, inline=inline, bytecode=bytecode)
+	finally:
+		os.chdir(cwd)
+	return directory / f"{project.name}.{env.MODULE_EXT if bytecode else env.NEKO_EXT}"
+
+def measure(runner: NekoRunner, program: Path, source: Path, runs: int):
+	# The modules written by the build don't go through nekoc
+	bytecode = source if source.suffix == ".n" else runner.compile(source)
+	command = [str(runner.nekovm), str(bytecode)]
+	completed = subprocess.run(command, env=runner.environ, capture_output=True, text=True)
+	expected = (program / "expected.txt").read_text()
+	if completed.returncode != 0 or completed.stdout != expected:
+		raise Exception(f"{program.name} printed {completed.stdout!r}{completed.stderr!r} instead of {expected!r}")
+	times = []
+	for _ in range(runs):
+		start = time.perf_counter()
+		subprocess.run(command, env=runner.environ, stdout=subprocess.DEVNULL, check=True)
+		times.append(time.perf_counter() - start)
+	return {
+		"runs" : runs,
+		"min" : min(times),
+		"median" : statistics.median(times),
+		"p90" : percentile(times, 90),
+		"p99" : percentile(times, 99),
+		"mean" : statistics.fmean(times),
+		"bytes" : source.stat().st_size,
+	}
+
+def main(argv: list[str]|None = None):
+	parser = argparse.ArgumentParser(description="Measure the run time of compiled Ramen programs")
+	parser.add_argument("programs", nargs="*", help="The programs of bench/runtime to run, all of them by default")
+	parser.add_argument("--runs", type=int, default=10)
+	parser.add_argument("--opt", type=int, default=0, help="The optimization level of the builds")
+	parser.add_argument("--noinline", action="store_true", help="Build without inlining the builtins, see optimizer.INLINE_BUILTINS")
+	parser.add_argument("--bytecode", action="store_true", help="Run the modules that the builds write without nekoc, see ramen/bytecode.py")
+	parser.add_argument("--neko", help="The directory of the NekoVM, the one of the platform in dependencies by default")
+	parser.add_argument("--save", help="Save the results as JSON")
+	parser.add_argument("--compare", help="Compare the medians with the results saved in a JSON file")
+	parser.add_argument("--threshold", type=float, default=0.2, help="The slowdown that fails a comparison, 0.2 is 20%%")
+	args = parser.parse_args(argv)
+
+	env = RamenEnv(ROOT / "dependencies")
+	runner = NekoRunner(args.neko or neko_directory(env.ramen_home))
+	names = args.programs or sorted(p.name for p in PROGRAMS.iterdir() if (p / "main.ramen").exists())
+	results = { "python" : platform.python_version(), "machine" : platform.machine(), "opt" : args.opt, "inline" : not args.noinline, "bytecode" : args.bytecode, "programs" : {} }
+	directory = Path(tempfile.mkdtemp())
+	try:
+		for name in names:
+			program = PROGRAMS / name
+			result = measure(runner, program, build(env, program, directory, args.opt, not args.noinline, args.bytecode), args.runs)
+			results["programs"][name] = result
+			print(f"{name:<10} median {result['median'] * 1000:>9.1f}ms p90 {result['p90'] * 1000:>9.1f}ms p99 {result['p99'] * 1000:>9.1f}ms min {result['min'] * 1000:>9.1f}ms")
+	finally:
+		shutil.rmtree(directory)
+
+	if args.save:
+		Path(args.save).write_text(json.dumps(results, indent=2) + "\n")
+	if args.compare:
+		baseline = json.loads(Path(args.compare).read_text())["programs"]
+		slower = False
+		for name, result in results["programs"].items():
+			if name not in baseline:
+				continue
+			change = result["median"] / baseline[name]["median"] - 1
+			slower |= change > args.threshold
+			print(f"{name:<10} {baseline[name]['median'] * 1000:>9.1f}ms -> {result['median'] * 1000:>9.1f}ms ({change:+.1%})")
+		if slower:
+			return 1
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,55 @@
+# Measure how long the CLI takes to start compared to the bare interpreter, and check that the
+# commands which don't compile anything don't import the compiler.
+# It exits with 1 when the startup of the CLI is over the budget, so it can gate a CI job
+# Usage: python bench/bench_startup.py [budget in ms] [runs]
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+CLI = ROOT / "Ramen" / "ramen.py"
+
+# The modules that must not be imported to print the help
+COMPILER_MODULES = ["ramen.lexer", "ramen.ast", "ramen.arena", "ramen.optimizer", "ramen.bundler", "ramen.environment", "inspect"]
+
+def best_time(command: list[str], runs: int):
+	best = None
+	for _ in range(runs):
+		start = time.perf_counter()
+		subprocess.run(command, cwd=CLI.parent, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+		elapsed = time.perf_counter() - start
+		best = elapsed if best is None else min(best, elapsed)
+	return best
+
+def imported_modules(argv: list[str]):
+	# The modules that the CLI imported to run a command
+	script = (
+		"import sys, runpy\n"
+		f"sys.argv = {['ramen.py'] + argv!r}\n"
+		f"sys.path.insert(0, {str(CLI.parent)!r})\n"
+		"try:\n"
+		f"\trunpy.run_path({str(CLI)!r}, run_name='__main__')\n"
+		"except SystemExit:\n"
+		"\tpass\n"
+		"sys.__stdout__.write('\\n'.join(sys.modules))\n"
+	)
+	completed = subprocess.run([sys.executable, "-c", script], cwd=CLI.parent, capture_output=True, text=True)
+	return set(completed.stdout.splitlines())
+
+if __name__ == "__main__":
+	budget = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.05
+	runs = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+	bare = best_time([sys.executable, "-c", "pass"], runs)
+	cli = best_time([sys.executable, str(CLI), "--help"], runs)
+	print(f"python -c pass {bare * 1000:.1f}ms, ramen --help {cli * 1000:.1f}ms ({(cli - bare) * 1000:+.1f}ms, budget {budget * 1000:.0f}ms)")
+
+	failed = False
+	loaded = imported_modules(["--help"]) & set(COMPILER_MODULES)
+	if loaded:
+		print(f"ramen --help imported {', '.join(sorted(loaded))}")
+		failed = True
+	if cli - bare > budget:
+		print("The startup of the CLI is over the budget")
+		failed = True
+	sys.exit(1 if failed else 0)
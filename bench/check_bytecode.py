@@ -0,0 +1,88 @@
+# Check the modules that the builds write with bytecode (see ramen/bytecode.py) against nekoc: every program of
+# bench/runtime and generated programs are built both ways at every optimization level, the Neko source is
+# compiled by nekoc, and both modules are run in the NekoVM. Their outputs have to be the same. It also prints
+# how long a build takes with and without nekoc. The recursion of tailcalls and mutualcalls is deeper than the stack
+# of the NekoVM, their modules only run when the tail calls replace the frame of the caller like nekoc does (TailCall)
+# Usage: python bench/check_bytecode.py [--neko DIR] [--generated 3] [programs...]
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "Ramen"))
+sys.path.insert(0, str(ROOT / "bench"))
+
+from ramen import RamenEnv
+from ramen.runner import NekoRunner, neko_directory
+from generator import generate_program
+
+PROGRAMS = ROOT / "bench" / "runtime"
+LEVELS = [0, 1, 2]
+
+def build(env: RamenEnv, project: Path, opt: int, bytecode: bool):
+	cwd = os.getcwd()
+	try:
+		os.chdir(project.parent)
+		start = time.perf_counter()
+		env.build_project(project.name, opt=opt, rebuild=True, bytecode=bytecode)
+		return time.perf_counter() - start
+	finally:
+		os.chdir(cwd)
+
+def run(runner: NekoRunner, module: Path):
+	completed = subprocess.run([str(runner.nekovm), str(module)], env=runner.environ, capture_output=True)
+	return completed.returncode, completed.stdout
+
+def check(env: RamenEnv, runner: NekoRunner, project: Path, opt: int):
+	# Returns the time of the build with nekoc and of the build with bytecode
+	source = project.parent / f"{project.name}.{env.NEKO_EXT}"
+	module = project.parent / f"{project.name}.{env.MODULE_EXT}"
+	reference = project.parent / f"{project.name}.nekoc.n"
+	seconds = build(env, project, opt, False)
+	start = time.perf_counter()
+	subprocess.run([str(runner.nekoc), str(source)], env=runner.environ, capture_output=True, check=True)
+	seconds += time.perf_counter() - start
+	os.replace(module, reference)
+	expected = run(runner, reference)
+	bytecode_seconds = build(env, project, opt, True)
+	result = run(runner, module)
+	if result != expected:
+		raise Exception(f"{project.name} at --opt {opt} printed {result!r} instead of {expected!r}")
+	return seconds, bytecode_seconds
+
+def main(argv: list[str]|None = None):
+	parser = argparse.ArgumentParser(description="Check the modules written without nekoc against nekoc")
+	parser.add_argument("programs", nargs="*", help="The programs of bench/runtime to check, all of them by default")
+	parser.add_argument("--neko", help="The directory of the NekoVM, the one of the platform in dependencies by default")
+	parser.add_argument("--generated", type=int, default=3, help="The number of generated programs (see generator.py) to check too")
+	parser.add_argument("--lines", type=int, default=300, help="The number of lines of the generated programs")
+	args = parser.parse_args(argv)
+
+	env = RamenEnv(ROOT / "dependencies")
+	runner = NekoRunner(args.neko or neko_directory(env.ramen_home))
+	names = args.programs or sorted(p.name for p in PROGRAMS.iterdir() if (p / "main.ramen").exists())
+	directory = Path(tempfile.mkdtemp())
+	try:
+		projects = []
+		for name in names:
+			projects.append(directory / name)
+			shutil.copytree(PROGRAMS / name, projects[-1], ignore=shutil.ignore_patterns(".ramencache"))
+		for seed in range(args.generated):
+			projects.append(directory / f"generated{seed}")
+			projects[-1].mkdir()
+			(projects[-1] / "main.ramen").write_text(generate_program(args.lines, seed))
+		for project in projects:
+			for opt in LEVELS:
+				nekoc, bytecode = check(env, runner, project, opt)
+				print(f"{project.name:<12} --opt {opt} same output, build {nekoc * 1000:>7.1f}ms with nekoc {bytecode * 1000:>7.1f}ms without")
+	finally:
+		shutil.rmtree(directory)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
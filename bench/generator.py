@@ -0,0 +1,164 @@
+# Generate synthetic Ramen programs of a given number of lines for the benchmarks. The programs use
+# functions, nested repeat and if statements, arrays, hashmaps and lambdas, and the same seed always
+# gives the same program so the measures of two runs are comparable. Main calls every function, so all
+# of the program runs, and a function only calls the functions that keep it under MAX_COST statements
+# Usage: python bench/generator.py [lines] [seed] > program.ramen
+import random
+import sys
+
+OPERATORS = ["+", "-", "*", "+", "-"]
+COMPARISONS = [">", "<", "==", "!=", ">=", "<="]
+KEYS = ["name", "size", "count", "total", "score"]
+MAX_DEPTH = 3
+MAX_COST = 20000 # The statements that a call of a function may run, with the ones of the functions it calls
+
+class ProgramGenerator:
+	def __init__(self, seed: int = 0):
+		self.random = random.Random(seed)
+		self.lines = []
+		self.functions = [] # (name, number of parameters, cost)
+		self.makers = [] # The functions that return a lambda
+		self.cost = 0 # The statements that the function being generated runs at most
+		self.runs = 1 # How many times the statement being generated runs in a call of the function
+
+	def emit(self, depth: int, text: str):
+		self.lines.append("\t" * depth + text)
+
+	def operand(self, scope: dict):
+		r = self.random.random()
+		if r < 0.35 and scope["scalars"]:
+			return self.random.choice(scope["scalars"])
+		if r < 0.55:
+			return str(self.random.randint(0, 1000))
+		if r < 0.65 and scope["arrays"]:
+			return f"{self.random.choice(scope['arrays'])}[{self.random.randint(0, 2)}]"
+		if r < 0.75 and scope["maps"]:
+			return f"{self.random.choice(scope['maps'])}[\"{self.random.choice(KEYS[:2])}\"]"
+		callees = [function for function in self.functions if self.cost + function[2] * self.runs <= MAX_COST]
+		if r < 0.85 and callees:
+			name, params, cost = self.random.choice(callees)
+			self.cost += cost * self.runs
+			return f"{name}({', '.join(self.operand_simple(scope) for _ in range(params))})"
+		if r < 0.9 and self.makers:
+			return f"{self.random.choice(self.makers)}({self.operand_simple(scope)})({self.operand_simple(scope)})"
+		return self.operand_simple(scope)
+
+	def operand_simple(self, scope: dict):
+		if scope["scalars"] and self.random.random() < 0.6:
+			return self.random.choice(scope["scalars"])
+		return str(self.random.randint(0, 100))
+
+	def expression(self, scope: dict):
+		terms = [self.operand(scope) for _ in range(self.random.randint(1, 4))]
+		writer = terms[0]
+		for term in terms[1:]:
+			writer += f" {self.random.choice(OPERATORS)} {term}"
+		# A lone operand is made an operation, the parser only takes literals, identifiers and operations after =
+		return writer if len(terms) > 1 else f"{writer} + 0"
+
+	def condition(self, scope: dict):
+		return f"{self.operand(scope)} {self.random.choice(COMPARISONS)} {self.operand(scope)}"
+
+	def statement(self, scope: dict, depth: int, in_loop: bool):
+		self.cost += self.runs
+		r = self.random.random()
+		# The counters of the loops (i) aren't assigned, the loops wouldn't end
+		targets = [name for name in scope["scalars"] if not name.startswith("i")]
+		nested = depth < MAX_DEPTH + 1
+		if r < 0.25:
+			name = f"v{len(scope['scalars'])}"
+			self.emit(depth, f"var {name} = {self.expression(scope)};")
+			scope["scalars"].append(name)
+		elif r < 0.35:
+			name = f"a{len(scope['arrays'])}"
+			self.emit(depth, f"var {name} = [{', '.join(self.operand_simple(scope) for _ in range(3))}];")
+			scope["arrays"].append(name)
+		elif r < 0.42:
+			name = f"m{len(scope['maps'])}"
+			pairs = ", ".join(f"{key} = {self.operand_simple(scope)}" for key in KEYS[:self.random.randint(2, len(KEYS))])
+			self.emit(depth, f"var {name} = [ {pairs} ];")
+			scope["maps"].append(name)
+		elif r < 0.55 and targets:
+			self.emit(depth, f"{self.random.choice(targets)} = {self.expression(scope)};")
+		elif r < 0.65:
+			self.emit(depth, f"echoln({self.expression(scope)});")
+		elif r < 0.8 and nested:
+			self.emit(depth, f"if ({self.condition(scope)}) {{")
+			self.block(scope, depth + 1, in_loop)
+			if self.random.random() < 0.5:
+				self.emit(depth, "} else {")
+				self.block(scope, depth + 1, in_loop)
+			self.emit(depth, "}")
+		elif r < 0.9 and nested:
+			counter = f"i{depth}"
+			count = self.random.randint(2, 50)
+			self.emit(depth, f"var {counter} = 0;")
+			self.emit(depth, "repeat")
+			self.emit(depth, "{")
+			self.emit(depth + 1, f"{counter} = {counter} + 1;")
+			self.emit(depth + 1, f"if ({counter} > {count}) {{")
+			self.emit(depth + 2, "break;")
+			self.emit(depth + 1, "}")
+			runs = self.runs
+			self.runs *= count
+			self.block(dict(scope, scalars=scope["scalars"] + [counter]), depth + 1, True)
+			self.runs = runs
+			self.emit(depth, "}")
+		elif in_loop and r < 0.93:
+			self.emit(depth, f"if ({self.condition(scope)}) {{")
+			self.emit(depth + 1, "continue;")
+			self.emit(depth, "}")
+		else:
+			self.emit(depth, f"var v{len(scope['scalars'])} = {self.expression(scope)};")
+			scope["scalars"].append(f"v{len(scope['scalars'])}")
+
+	def block(self, scope: dict, depth: int, in_loop: bool):
+		# The variables of a block are only visible in the block
+		scope = { key : list(value) for key, value in scope.items() }
+		for _ in range(self.random.randint(1, 4)):
+			self.statement(scope, depth, in_loop)
+
+	def function(self):
+		index = len(self.functions) + len(self.makers)
+		params = [f"p{i}" for i in range(self.random.randint(0, 3))]
+		scope = { "scalars" : list(params), "arrays" : [], "maps" : [] }
+		self.cost = 0
+		if self.random.random() < 0.15:
+			# A function that returns a lambda which captures its parameter
+			name = f"Make{index}"
+			self.emit(0, f"fun {name}(var k)")
+			self.emit(0, "{")
+			self.emit(1, f"return fun(var x) {{ return x * k + {self.random.randint(0, 9)}; }};")
+			self.emit(0, "}")
+			self.makers.append(name)
+		else:
+			name = f"F{index}"
+			self.emit(0, f"fun {name}({', '.join(f'var {p}' for p in params)})")
+			self.emit(0, "{")
+			for _ in range(self.random.randint(3, 8)):
+				self.statement(scope, 1, False)
+			self.emit(1, f"return {self.expression(scope)};")
+			self.emit(0, "}")
+			self.functions.append((name, len(params), self.cost))
+		self.emit(0, "")
+
+	def generate(self, lines: int):
+		# Main takes a line for every function
+		while len(self.lines) + len(self.functions) + len(self.makers) < lines - 3:
+			self.function()
+		self.emit(0, "fun Main()")
+		self.emit(0, "{")
+		for name, params, _ in self.functions:
+			self.emit(1, f"echoln({name}({', '.join(str(self.random.randint(0, 100)) for _ in range(params))}));")
+		for name in self.makers:
+			self.emit(1, f"echoln({name}({self.random.randint(0, 100)})({self.random.randint(0, 100)}));")
+		self.emit(0, "}")
+		return "\n".join(self.lines) + "\n"
+
+def generate_program(lines: int, seed: int = 0):
+	return ProgramGenerator(seed).generate(lines)
+
+if __name__ == "__main__":
+	lines = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+	seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+	sys.stdout.write(generate_program(lines, seed))
@@ -0,0 +1,137 @@
+# The benchmark suite of the compiler front end: programs made by the generator are lexed (Lexer.parse_tokens),
+# parsed (Parser.parse_ast) and generated (as_neko) at every scale, and the throughput and the peak memory
+# (tracemalloc) of every phase are measured. The results are saved as a JSON baseline, and comparing a run
+# with a baseline fails when a measure is worse than the threshold
+# Usage: python bench/suite.py [--scales 1000,10000,100000] [--save FILE] [--compare FILE] [--threshold 0.2]
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "Ramen"))
+sys.path.insert(0, str(ROOT / "bench"))
+
+from ramen import Lexer, Parser
+from ramen.ast import walk
+from generator import generate_program
+
+DEFAULT_SCALES = [1000, 10000, 100000]
+DEFAULT_BASELINE = ROOT / "bench" / "baselines" / "default.json"
+SEED = 0
+
+# The measures of a phase where more is better, the others (the memory) are better when they are less
+THROUGHPUTS = ["tokens_per_s", "nodes_per_s", "bytes_per_s"]
+
+def best_time(function, repeat: int):
+	best = None
+	for _ in range(repeat):
+		start = time.perf_counter()
+		result = function()
+		elapsed = time.perf_counter() - start
+		best = elapsed if best is None else min(best, elapsed)
+	return best, result
+
+def peak_memory(function):
+	tracemalloc.start()
+	try:
+		function()
+		return tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+
+def measure(lines: int, repeat: int = 3):
+	source = generate_program(lines, SEED)
+	lex_time, tokens = best_time(lambda: Lexer(source).parse_tokens(), repeat)
+	parse_time, program = best_time(lambda: Parser(tokens).parse_ast(), repeat)
+	neko_time, output = best_time(lambda: program.as_neko(), repeat)
+	nodes = sum(1 for _ in walk(program))
+	return {
+		"lines" : source.count("\n"),
+		"characters" : len(source),
+		"tokens" : len(tokens),
+		"nodes" : nodes,
+		"output_bytes" : len(output),
+		"lex" : {
+			"seconds" : lex_time,
+			"tokens_per_s" : len(tokens) / lex_time,
+			"peak_bytes" : peak_memory(lambda: Lexer(source).parse_tokens()),
+		},
+		"parse" : {
+			"seconds" : parse_time,
+			"nodes_per_s" : nodes / parse_time,
+			"peak_bytes" : peak_memory(lambda: Parser(tokens).parse_ast()),
+		},
+		"as_neko" : {
+			"seconds" : neko_time,
+			"bytes_per_s" : len(output) / neko_time,
+			"peak_bytes" : peak_memory(lambda: program.as_neko()),
+		},
+	}
+
+def run_suite(scales: list[int], repeat: int = 3, log=print):
+	results = {
+		"python" : platform.python_version(),
+		"machine" : platform.machine(),
+		"seed" : SEED,
+		"scales" : {},
+	}
+	for lines in scales:
+		result = measure(lines, repeat)
+		results["scales"][str(lines)] = result
+		log(
+			f"{lines:>8} lines {result['tokens']:>9} tokens "
+			f"lex {result['lex']['tokens_per_s']:>10.0f} tokens/s {result['lex']['peak_bytes'] / 2**20:>7.1f} MiB "
+			f"parse {result['parse']['nodes_per_s']:>10.0f} nodes/s {result['parse']['peak_bytes'] / 2**20:>7.1f} MiB "
+			f"as_neko {result['as_neko']['bytes_per_s'] / 2**20:>7.1f} MiB/s {result['as_neko']['peak_bytes'] / 2**20:>7.1f} MiB"
+		)
+	return results
+
+def compare(results: dict, baseline: dict, threshold: float = 0.2):
+	# The measures that are worse than the baseline by more than threshold (0.2 is 20%), as readable lines
+	regressions = []
+	for scale, result in results["scales"].items():
+		if scale not in baseline["scales"]:
+			continue
+		for phase in ["lex", "parse", "as_neko"]:
+			for name, value in result[phase].items():
+				if name == "seconds":
+					continue
+				expected = baseline["scales"][scale][phase].get(name)
+				if not expected:
+					continue
+				change = value / expected - 1
+				worse = -change if name in THROUGHPUTS else change
+				if worse > threshold:
+					regressions.append(f"{scale} lines {phase} {name}: {expected:.0f} -> {value:.0f} ({change:+.1%})")
+	return regressions
+
+def main(argv: list[str]|None = None):
+	parser = argparse.ArgumentParser(description="Benchmark the lexer, the parser and the code generation")
+	parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)), help="Comma separated numbers of lines, up to 1000000")
+	parser.add_argument("--repeat", type=int, default=3, help="The best time of this many runs is kept")
+	parser.add_argument("--save", nargs="?", const=str(DEFAULT_BASELINE), help="Save the results as a baseline")
+	parser.add_argument("--compare", nargs="?", const=str(DEFAULT_BASELINE), help="Fail when the results are worse than a baseline")
+	parser.add_argument("--threshold", type=float, default=0.2, help="The regression that fails a comparison, 0.2 is 20%%")
+	args = parser.parse_args(argv)
+
+	results = run_suite([int(scale) for scale in args.scales.split(",")], args.repeat)
+	if args.save:
+		Path(args.save).parent.mkdir(parents=True, exist_ok=True)
+		Path(args.save).write_text(json.dumps(results, indent=2) + "\n")
+		print(f"Saved the baseline to {args.save}")
+	if args.compare:
+		baseline = json.loads(Path(args.compare).read_text())
+		regressions = compare(results, baseline, args.threshold)
+		for regression in regressions:
+			print(f"Regression: {regression}")
+		if regressions:
+			return 1
+		print(f"No regression over {args.threshold:.0%} against {args.compare}")
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())